@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+import numpy as np
+from metrics_engine import optimize_cost_threshold, optimize_f1_threshold, roc_auc, bootstrap_metrics
+
+
+def file_md5(path, chunk_size=8 * 1024 * 1024):
+    hasher = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _find_mlmodel_dir(base_dir):
+    for root, _, files in os.walk(base_dir):
+        if "MLmodel" in files:
+            return root
+    raise FileNotFoundError(f"Could not find 'MLmodel' under {base_dir}.")
+
+
+def champion_probabilities(champion_path, X_test, version=None, data_hash=None, cache_dir=None):
+    """Champion P(default) on the test split, cached as <cache_dir>/champion-<version>-<data_hash>.npy.
+
+    Returns (probas, from_cache). The cache is only used when the version and the
+    test-data hash are both known, so a new split or a new champion always rescores.
+    """
+    cache_path = None
+    if cache_dir and version and data_hash:
+        cache_path = os.path.join(cache_dir, f"champion-{version}-{data_hash}.npy")
+        if os.path.exists(cache_path):
+            probas = np.load(cache_path)
+            if len(probas) == len(X_test):
+                return probas, True
+
+    import mlflow.sklearn
+    champion = mlflow.sklearn.load_model(_find_mlmodel_dir(champion_path))
+    probas = champion.predict_proba(X_test)[:, 1]
+
+    if cache_path:
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp.npy"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(tmp_path, probas)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            # a read-only or full cache mount only costs the next run a rescore
+            print(f"⚠️ Could not cache champion predictions in {cache_dir}: {e}")
+    return probas, False
+
+
+def compare_with_champion(table, f1_thresh, cost_thresh, champion_table, n_boot=200):
+    """Side-by-side AUC, F1/cost-optimal thresholds and cost, with paired bootstrap deltas."""
+    champion_cost_thresh, champion_cost = optimize_cost_threshold(champion_table)
+    champion_f1_thresh, champion_f1 = optimize_f1_threshold(champion_table)
+    _, challenger_cost = optimize_cost_threshold(table)
+    _, challenger_f1 = optimize_f1_threshold(table)
+
+    comparison = {
+        "challenger": {"roc_auc": roc_auc(table), "f1_score": challenger_f1, "misclassification_cost": challenger_cost,
+                       "threshold_f1": f1_thresh, "threshold_cost": cost_thresh},
+        "champion": {"roc_auc": roc_auc(champion_table), "f1_score": champion_f1,
+                     "misclassification_cost": champion_cost,
+                     "threshold_f1": champion_f1_thresh, "threshold_cost": champion_cost_thresh},
+    }
+    comparison["delta"] = {
+        name: comparison["challenger"][name] - comparison["champion"][name]
+        for name in ("roc_auc", "f1_score", "misclassification_cost")
+    }
+    if n_boot > 0:
+        paired = bootstrap_metrics(table, f1_thresh, cost_thresh, n_boot=n_boot,
+                                   reference=(champion_table, champion_f1_thresh, champion_cost_thresh))
+        comparison["bootstrap"] = {name[len("delta_"):]: ci for name, ci in paired.items() if name.startswith("delta_")}
+    return comparison
+
+
+def registration_gate(comparison, auc_tolerance=0.0, cost_tolerance=0.0):
+    """Blocks a challenger only when it is worse than the champion beyond tolerance.
+
+    With paired bootstrap deltas the whole 95% interval has to be on the wrong side
+    (AUC delta ci_high < -auc_tolerance, cost delta ci_low > allowed), so a retrain
+    that differs from the champion only by noise is not blocked. Without them the
+    point estimates are compared. cost_tolerance is relative to the champion's cost.
+    Returns (passed, reasons).
+    """
+    if comparison is None:
+        return True, ["no comparable champion"]
+    delta, ci = comparison["delta"], comparison.get("bootstrap", {})
+    allowed_cost = cost_tolerance * comparison["champion"]["misclassification_cost"]
+    auc_bound = ci["roc_auc"]["high"] if "roc_auc" in ci else delta["roc_auc"]
+    cost_bound = ci["misclassification_cost"]["low"] if "misclassification_cost" in ci else delta["misclassification_cost"]
+    basis = "95% CI" if ci else "point estimate"
+
+    reasons = []
+    if auc_bound < -auc_tolerance:
+        reasons.append(f"ROC-AUC {delta['roc_auc']:+.4f} vs champion ({basis} upper bound {auc_bound:+.4f}, "
+                       f"tolerance {auc_tolerance})")
+    if cost_bound > allowed_cost:
+        reasons.append(f"cost {delta['misclassification_cost']:+,.0f} vs champion ({basis} lower bound "
+                       f"{cost_bound:+,.0f}, allowed {allowed_cost:+,.0f})")
+    return not reasons, reasons or [f"not worse than champion ({basis})"]
+
+
+def write_comparison(comparison, passed, reasons, output_path):
+    path = os.path.join(output_path, "champion_comparison.json")
+    with open(path, "w") as f:
+        json.dump({**(comparison or {}), "gate_passed": passed, "gate_reasons": reasons}, f, indent=2, default=float)
+    return path
+
+
+def format_comparison(comparison):
+    rows = [("", "challenger", "champion", "delta")]
+    for name in ("roc_auc", "f1_score", "misclassification_cost", "threshold_f1", "threshold_cost"):
+        challenger, champion = comparison["challenger"][name], comparison["champion"][name]
+        delta = comparison["delta"].get(name, challenger - champion)
+        fmt = "{:,.0f}" if name == "misclassification_cost" else "{:.4f}"
+        rows.append((name, fmt.format(challenger), fmt.format(champion), ("+" if delta >= 0 else "") + fmt.format(delta)))
+    return "\n".join(f"{a:<24}{b:>16}{c:>16}{d:>16}" for a, b, c, d in rows)
@@ -1,138 +1,128 @@
 import argparse
 import joblib
 import os
-import numpy as np
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
 import mlflow
-import shap
-from sklearn.metrics import (
-    accuracy_score, f1_score, roc_auc_score, confusion_matrix,
-    precision_recall_curve, roc_curve
+from metrics_engine import (
+    build_score_table, optimize_cost_threshold, optimize_f1_threshold,
+    confusion_at, accuracy_at, f1_at, roc_auc, roc_curve, pr_curve,
+    ks_statistic, lift_table, bootstrap_metrics
+)
+from segment_report import load_raw_features, build_segment_report, write_segment_report
+from render import build_render_jobs, render_artifacts
+from permutation_importance import permutation_importance
+from champion import (
+    file_md5, champion_probabilities, compare_with_champion, registration_gate, write_comparison, format_comparison
 )
 
 def load_data(input_data, model_path):
     X_test, y_test = joblib.load(os.path.join(input_data, "test.pkl"))
-    model = joblib.load(os.path.join(model_path, "best_model.pkl"))
+    mlflow_model_dir = os.path.join(model_path, "mlflow_model")
+    if os.path.isdir(mlflow_model_dir):
+        # the MLflow copy puts its bundled code (e.g. the stacked ensemble class) on the path
+        import mlflow.sklearn
+        model = mlflow.sklearn.load_model(mlflow_model_dir)
+    else:
+        model = joblib.load(os.path.join(model_path, "best_model.pkl"))
     return X_test, y_test, model
 
-def optimize_cost_threshold(y_true, probas, cost_fp=1000, cost_fn=900):
-    best_thresh = 0.5
-    best_cost = float('inf')
-    for t in np.arange(0.2, 0.8, 0.01):
-        preds = (probas >= t).astype(int)
-        fp = np.sum((preds == 1) & (y_true == 0))
-        fn = np.sum((preds == 0) & (y_true == 1))
-        total_cost = (fp * cost_fp) + (fn * cost_fn)
-        if total_cost < best_cost:
-            best_cost = total_cost
-            best_thresh = t
-    return best_thresh, best_cost
-
-def optimize_f1_threshold(y_true, probas):
-    best_thresh = 0.5
-    best_f1 = 0
-    for t in np.arange(0.2, 0.8, 0.01):
-        preds = (probas >= t).astype(int)
-        f1 = f1_score(y_true, preds)
-        if f1 > best_f1:
-            best_f1 = f1
-            best_thresh = t
-    return best_thresh, best_f1
-
-def evaluate_model(model, X_test, y_test, threshold):
-    probas = model.predict_proba(X_test)[:, 1]
-    preds = (probas >= threshold).astype(int)
-    acc = accuracy_score(y_test, preds)
-    f1 = f1_score(y_test, preds)
-    roc_auc = roc_auc_score(y_test, probas)
-    cm = confusion_matrix(y_test, preds)
-    return preds, probas, cm, y_test, acc, f1, roc_auc
-
-def plot_metrics(cm, probas, y_test, output_path):
-    os.makedirs(output_path, exist_ok=True)
-    cm_path = os.path.join(output_path, "confusion_matrix.png")
-    roc_path = os.path.join(output_path, "roc_curve.png")
-    pr_path = os.path.join(output_path, "pr_curve.png")
-
-    plt.figure(figsize=(6, 4))
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
-    plt.title("Confusion Matrix")
-    plt.xlabel("Predicted")
-    plt.ylabel("Actual")
-    plt.tight_layout()
-    plt.savefig(cm_path)
-    plt.close()
-
-    fpr, tpr, _ = roc_curve(y_test, probas)
-    plt.figure(figsize=(6, 4))
-    plt.plot(fpr, tpr, label='ROC Curve')
-    plt.plot([0, 1], [0, 1], 'k--')
-    plt.title("ROC Curve")
-    plt.xlabel("False Positive Rate")
-    plt.ylabel("True Positive Rate")
-    plt.tight_layout()
-    plt.savefig(roc_path)
-    plt.close()
-
-    precision, recall, _ = precision_recall_curve(y_test, probas)
-    plt.figure(figsize=(6, 4))
-    plt.plot(recall, precision)
-    plt.title("Precision-Recall Curve")
-    plt.xlabel("Recall")
-    plt.ylabel("Precision")
-    plt.tight_layout()
-    plt.savefig(pr_path)
-    plt.close()
-
-    return cm_path, roc_path, pr_path
-
-def generate_shap_plot(model, X_test, output_path):
-    shap_path = os.path.join(output_path, "shap_beeswarm.png")
-    try:
-        explainer = shap.TreeExplainer(model)
-        shap_values = explainer.shap_values(X_test)
-        plt.figure(figsize=(10, 6))
-        shap.summary_plot(shap_values, X_test, show=False)
-        plt.tight_layout()
-        plt.savefig(shap_path)
-        plt.close()
-        print("SHAP summary plot saved.")
-        return shap_path
-    except Exception as e:
-        print(f"SHAP explainability failed: {e}")
-        return None
-
-def write_notes(output_path, cm, cost, threshold_type):
+def evaluate_model(table, threshold):
+    cm = confusion_at(table, threshold)
+    acc = accuracy_at(table, threshold)
+    f1 = f1_at(table, threshold)
+    auc = roc_auc(table)
+    ks, ks_thresh = ks_statistic(table)
+    return cm, acc, f1, auc, ks, ks_thresh
+
+def plot_metrics(table, cm, model, X_test, output_path):
+    fpr, tpr, _ = roc_curve(table)
+    precision, recall, _ = pr_curve(table)
+    jobs = build_render_jobs(cm, (fpr, tpr), (recall, precision), model, X_test, output_path)
+    return render_artifacts(jobs)
+
+def write_notes(output_path, table, cm, cost, threshold_type, intervals=None, champion_line=None):
+    ks, ks_thresh = ks_statistic(table)
+    lift = lift_table(table)
     notes_path = os.path.join(output_path, "model_notes.txt")
     with open(notes_path, "w") as f:
         f.write("Model Limitations and Potential Biases:\n")
         f.write("-- Class imbalance may affect precision/recall.\n")
         f.write(f"-- Threshold optimized for: {threshold_type}\n")
         f.write("-- Model doesn't consider temporal trends or behavioral drift.\n")
+        f.write("-- Per-segment AUC/F1/default rate/cost by sex, education, marriage, age and limit_bal: segment_report.csv\n")
         f.write(f"-- Confusion Matrix: {cm.tolist()}\n")
         f.write(f"-- Estimated total cost of misclassification: {cost}\n")
+        f.write(f"-- KS statistic: {ks:.4f} at threshold {ks_thresh:.4f}\n")
+        f.write(f"-- Top-decile lift: {lift['lift'][0]:.2f} "
+                f"(captures {lift['capture_rate'][0]:.1%} of defaulters)\n")
+        for name, ci in (intervals or {}).items():
+            f.write(f"-- {name}: {ci['estimate']:.4f} (95% bootstrap CI {ci['low']:.4f} - {ci['high']:.4f})\n")
+        if champion_line:
+            f.write(f"-- {champion_line}\n")
     return notes_path
 
+def evaluate_champion(args, table, f1_thresh, cost_thresh, X_test, y_test):
+    """Scores the registered champion on the same test split; None when there is no comparable champion."""
+    if not args.champion_model:
+        print("No champion model supplied: skipping champion/challenger comparison.")
+        return None
+    try:
+        champion_probas, cached = champion_probabilities(
+            args.champion_model, X_test, version=args.champion_version,
+            data_hash=file_md5(os.path.join(args.input_data, "test.pkl")), cache_dir=args.cache_dir)
+    except (KeyError, ValueError) as e:
+        # a champion trained on a different feature set cannot score this split
+        print(f"⚠️ Champion {args.champion_version} cannot score the current features ({e}): skipping comparison.")
+        return None
+    print(f"Champion {args.champion_version or ''} predictions {'loaded from cache' if cached else 'computed'}.")
+    champion_table = build_score_table(y_test, champion_probas)
+    return compare_with_champion(table, f1_thresh, cost_thresh, champion_table, n_boot=args.n_bootstrap)
+
+def register_challenger(args, passed):
+    model_dir = os.path.join(args.model_path, "mlflow_model")
+    run = mlflow.active_run() or mlflow.start_run()
+    mlflow.log_artifacts(model_dir, artifact_path="model")
+    # a forced registration is never picked as the next run's champion
+    registered = mlflow.register_model(f"runs:/{run.info.run_id}/model", args.register_model_name,
+                                       tags={"registration_gate": "passed" if passed else "forced"})
+    print(f"Registered {registered.name} version {registered.version}.")
+    return registered
+
 def main(args):
     X_test, y_test, model = load_data(args.input_data, args.model_path)
     probas = model.predict_proba(X_test)[:, 1]
+    table = build_score_table(y_test, probas)
 
-    cost_thresh, cost = optimize_cost_threshold(y_test, probas)
-    f1_thresh, best_f1 = optimize_f1_threshold(y_test, probas)
+    cost_thresh, cost = optimize_cost_threshold(table)
+    f1_thresh, best_f1 = optimize_f1_threshold(table)
 
     # Choose F1 threshold for main evaluation, but log both
     threshold = f1_thresh
     threshold_type = "F1"
     print(f"Using F1-optimal threshold: {threshold:.2f} | F1 Score: {best_f1:.4f}")
 
-    preds, probas, cm, y_test, acc, f1, roc_auc = evaluate_model(model, X_test, y_test, threshold)
-    cm_path, roc_path, pr_path = plot_metrics(cm, probas, y_test, args.output_path)
-    notes_path = write_notes(args.output_path, cm, cost, threshold_type)
-    shap_path = generate_shap_plot(model, X_test, args.output_path)
+    cm, acc, f1, auc, ks, ks_thresh = evaluate_model(table, threshold)
+
+    intervals = {}
+    if args.n_bootstrap > 0:
+        intervals = bootstrap_metrics(table, f1_thresh, cost_thresh, n_boot=args.n_bootstrap)
+        for name, ci in intervals.items():
+            print(f"{name}: {ci['estimate']:.4f} [{ci['low']:.4f}, {ci['high']:.4f}]")
+
+    os.makedirs(args.output_path, exist_ok=True)
+    comparison = evaluate_champion(args, table, f1_thresh, cost_thresh, X_test, y_test)
+    passed, reasons = registration_gate(comparison, args.gate_auc_tolerance, args.gate_cost_tolerance)
+    comparison_path = write_comparison(comparison, passed, reasons, args.output_path)
+    champion_line = None
+    if comparison is not None:
+        print(format_comparison(comparison))
+        champion_line = (f"Champion {args.champion_version or ''}: ROC-AUC {comparison['delta']['roc_auc']:+.4f}, "
+                         f"cost {comparison['delta']['misclassification_cost']:+,.0f} vs champion "
+                         f"(registration gate {'passed' if passed else 'failed'})")
+    notes_path = write_notes(args.output_path, table, cm, cost, threshold_type, intervals, champion_line)
+
+    X_raw = load_raw_features(args.input_data, X_test)
+    segment_report = build_segment_report(X_raw, y_test, probas, threshold)
+    segment_path = write_segment_report(segment_report, args.output_path)
 
     # MLflow logging
     mlflow.log_param("threshold_used", threshold)
@@ -141,16 +131,52 @@ def main(args):
     mlflow.log_param("threshold_cost_value", cost_thresh)
     mlflow.log_metric("test_accuracy", acc)
     mlflow.log_metric("test_f1_score", f1)
-    mlflow.log_metric("test_roc_auc", roc_auc)
+    mlflow.log_metric("test_roc_auc", auc)
+    mlflow.log_metric("test_ks_statistic", ks)
     mlflow.log_metric("test_samples", len(y_test))
     mlflow.log_metric("estimated_misclassification_cost", cost)
+    metric_names = {"roc_auc": "test_roc_auc", "f1_score": "test_f1_score",
+                    "misclassification_cost": "estimated_misclassification_cost"}
+    for name, ci in intervals.items():
+        mlflow.log_metric(f"{metric_names[name]}_ci_low", ci["low"])
+        mlflow.log_metric(f"{metric_names[name]}_ci_high", ci["high"])
+    if intervals:
+        mlflow.log_param("n_bootstrap", args.n_bootstrap)
+
+    if comparison is not None:
+        for side in ("champion", "delta"):
+            for name, value in comparison[side].items():
+                mlflow.log_metric(f"{side}_{name}", value)
+        for name, ci in comparison.get("bootstrap", {}).items():
+            mlflow.log_metric(f"delta_{name}_ci_low", ci["low"])
+            mlflow.log_metric(f"delta_{name}_ci_high", ci["high"])
+    mlflow.log_metric("registration_gate_passed", int(passed))
 
-    mlflow.log_artifact(cm_path)
-    mlflow.log_artifact(roc_path)
-    mlflow.log_artifact(pr_path)
     mlflow.log_artifact(notes_path)
-    if shap_path:
-        mlflow.log_artifact(shap_path)
+    mlflow.log_artifact(segment_path)
+    mlflow.log_artifact(comparison_path)
+
+    if args.permutation_repeats > 0:
+        importance = permutation_importance(model, X_test, y_test, n_repeats=args.permutation_repeats,
+                                            sample_rows=args.permutation_sample_rows)
+        print("Top permutation importances (ROC-AUC drop):")
+        print(importance.head(10).to_string(index=False))
+        mlflow.log_table(data=importance, artifact_file="permutation_importance.json")
+
+    if args.metrics_only:
+        print("Metrics-only mode: skipping plot rendering.")
+    else:
+        for path in plot_metrics(table, cm, model, X_test, args.output_path).values():
+            if path:
+                mlflow.log_artifact(path)
+
+    if args.register_model_name:
+        if passed or args.force_register:
+            if not passed:
+                print(f"⚠️ Registration gate failed ({'; '.join(reasons)}) but force_register is set.")
+            register_challenger(args, passed)
+        else:
+            print(f"❌ Registration blocked: {'; '.join(reasons)}.")
 
     print("✅ Evaluation complete. Threshold tuned for F1. Metrics and artifacts logged.")
 
@@ -159,5 +185,25 @@ if __name__ == "__main__":
     parser.add_argument("--input_data", type=str, required=True)
     parser.add_argument("--model_path", type=str, required=True)
     parser.add_argument("--output_path", type=str, required=True)
+    parser.add_argument("--metrics_only", type=lambda v: str(v).lower() == "true", default=False,
+                        help="Skip image rendering (confusion matrix, curves, SHAP)")
+    parser.add_argument("--n_bootstrap", type=int, default=200,
+                        help="Poisson-bootstrap replicates for metric confidence intervals (0 disables)")
+    parser.add_argument("--permutation_repeats", type=int, default=5,
+                        help="Shuffles per feature for permutation importance (0 disables)")
+    parser.add_argument("--permutation_sample_rows", type=int, default=20000,
+                        help="Test rows sampled for permutation importance (0 uses all)")
+    parser.add_argument("--champion_model", type=str, default=None,
+                        help="Currently registered model (MLflow format) to compare against")
+    parser.add_argument("--champion_version", type=str, default=None, help="Version of the champion, used as cache key")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Folder caching champion test-set predictions")
+    parser.add_argument("--gate_auc_tolerance", type=float, default=0.0,
+                        help="ROC-AUC drop vs the champion that blocks registration once the whole 95%% CI is beyond it")
+    parser.add_argument("--gate_cost_tolerance", type=float, default=0.0,
+                        help="Relative cost increase vs the champion that blocks registration once the whole 95%% CI is beyond it")
+    parser.add_argument("--force_register", type=lambda v: str(v).lower() == "true", default=False,
+                        help="Register the challenger even if it fails the gate")
+    parser.add_argument("--register_model_name", type=str, default="credit-default-model",
+                        help="Registered model name (empty skips registration)")
     args = parser.parse_args()
     main(args)
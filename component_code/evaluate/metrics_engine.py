@@ -0,0 +1,275 @@
+import numpy as np
+
+
+def build_score_table(y_true, probas):
+    """Sorts the scores once and keeps the cumulative label counts every metric is derived from."""
+    y = np.asarray(y_true).astype(np.int64)
+    scores = np.asarray(probas, dtype=np.float64)
+
+    order = np.argsort(-scores, kind="mergesort")
+    sorted_scores = scores[order]
+    cum_pos = np.cumsum(y[order])
+
+    # last row of every run of tied scores, i.e. one entry per distinct threshold
+    ends = np.flatnonzero(np.r_[sorted_scores[1:] != sorted_scores[:-1], True])
+    tps = cum_pos[ends]
+    fps = ends + 1 - tps
+
+    n_pos = int(cum_pos[-1]) if len(cum_pos) else 0
+    return {
+        "order": order,
+        "sorted_scores": sorted_scores,
+        "cum_pos": cum_pos,
+        "thresholds": sorted_scores[ends],
+        "tps": tps,
+        "fps": fps,
+        "n_pos": n_pos,
+        "n_neg": len(y) - n_pos,
+    }
+
+
+def counts_at(table, thresholds):
+    """Returns (tp, fp, fn, tn) arrays for `probas >= t` at each threshold."""
+    t = np.atleast_1d(np.asarray(thresholds, dtype=np.float64))
+    k = np.searchsorted(-table["thresholds"], -t, side="right")
+    tps = np.r_[0, table["tps"]]
+    fps = np.r_[0, table["fps"]]
+    tp, fp = tps[k], fps[k]
+    return tp, fp, table["n_pos"] - tp, table["n_neg"] - fp
+
+
+def confusion_at(table, threshold):
+    tp, fp, fn, tn = (int(c[0]) for c in counts_at(table, threshold))
+    return np.array([[tn, fp], [fn, tp]])
+
+
+def accuracy_at(table, threshold):
+    tp, _, _, tn = counts_at(table, threshold)
+    return float((tp[0] + tn[0]) / (table["n_pos"] + table["n_neg"]))
+
+
+def f1_from_counts(tp, fp, fn):
+    denom = 2 * tp + fp + fn
+    return np.divide(2 * tp, denom, out=np.zeros(np.shape(tp), dtype=np.float64), where=denom > 0)
+
+
+def f1_at(table, threshold):
+    tp, fp, fn, _ = counts_at(table, threshold)
+    return float(f1_from_counts(tp, fp, fn)[0])
+
+
+def cost_at(table, thresholds, cost_fp=1000, cost_fn=900):
+    _, fp, fn, _ = counts_at(table, thresholds)
+    return fp * cost_fp + fn * cost_fn
+
+
+def roc_curve(table):
+    fpr = np.r_[0, table["fps"]] / max(table["n_neg"], 1)
+    tpr = np.r_[0, table["tps"]] / max(table["n_pos"], 1)
+    return fpr, tpr, np.r_[np.inf, table["thresholds"]]
+
+
+def pr_curve(table):
+    tps, fps = table["tps"], table["fps"]
+    precision = np.r_[1.0, tps / (tps + fps)]
+    recall = np.r_[0.0, tps / max(table["n_pos"], 1)]
+    return precision, recall, np.r_[np.inf, table["thresholds"]]
+
+
+def roc_auc(table):
+    fpr, tpr, _ = roc_curve(table)
+    return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1])) / 2)
+
+
+def ks_statistic(table):
+    fpr, tpr, thresholds = roc_curve(table)
+    best = int(np.argmax(tpr - fpr))
+    return float(tpr[best] - fpr[best]), float(thresholds[best])
+
+
+def lift_table(table, n_bins=10):
+    """Cumulative lift and capture rate for the top 10%, 20%, ... of scored rows."""
+    n = len(table["cum_pos"])
+    base_rate = table["n_pos"] / max(n, 1)
+    fractions = np.arange(1, n_bins + 1) / n_bins
+    rows = np.maximum(np.ceil(fractions * n).astype(np.int64), 1)
+    captured = table["cum_pos"][rows - 1]
+    return {
+        "fraction": fractions,
+        "lift": (captured / rows) / base_rate if base_rate > 0 else np.zeros(n_bins),
+        "capture_rate": captured / max(table["n_pos"], 1),
+    }
+
+
+def optimize_cost_threshold(table, cost_fp=1000, cost_fn=900):
+    grid = np.arange(0.2, 0.8, 0.01)
+    costs = cost_at(table, grid, cost_fp, cost_fn)
+    best = int(np.argmin(costs))
+    return grid[best], int(costs[best])
+
+
+def optimize_f1_threshold(table):
+    grid = np.arange(0.2, 0.8, 0.01)
+    tp, fp, fn, _ = counts_at(table, grid)
+    f1 = f1_from_counts(tp, fp, fn)
+    best = int(np.argmax(f1))
+    if f1[best] <= 0:
+        return 0.5, 0.0
+    return grid[best], float(f1[best])
+
+
+def grouped_metrics(group_ids, n_groups, y_true, probas, threshold, cost_fp=1000, cost_fn=900):
+    """Per-group count, default rate, AUC, F1 and cost from one lexsort and a few bincounts."""
+    g = np.asarray(group_ids, dtype=np.int64)
+    y = np.asarray(y_true).astype(np.int64)
+    scores = np.asarray(probas, dtype=np.float64)
+    n = len(g)
+
+    count = np.bincount(g, minlength=n_groups)
+    n_pos = np.bincount(g, weights=y, minlength=n_groups)
+    n_neg = count - n_pos
+
+    pred = scores >= threshold
+    tp = np.bincount(g, weights=pred & (y == 1), minlength=n_groups)
+    fp = np.bincount(g, weights=pred & (y == 0), minlength=n_groups)
+    fn = n_pos - tp
+
+    # Mann-Whitney AUC: mid-ranks of the scores within each group
+    order = np.lexsort((scores, g))
+    gs, ss, ys = g[order], scores[order], y[order]
+    pos = np.arange(n)
+    group_start = np.r_[True, gs[1:] != gs[:-1]]
+    tie_start = group_start | np.r_[True, ss[1:] != ss[:-1]]
+    start_idx = np.maximum.accumulate(np.where(group_start, pos, 0))
+    tie_id = np.cumsum(tie_start) - 1
+    ranks = (pos - start_idx + 1).astype(np.float64)
+    mid_ranks = (np.bincount(tie_id, weights=ranks) / np.bincount(tie_id))[tie_id]
+    pos_rank_sum = np.bincount(gs, weights=mid_ranks * ys, minlength=n_groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        auc = (pos_rank_sum - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+        default_rate = n_pos / count
+    auc[(n_pos == 0) | (n_neg == 0)] = np.nan
+
+    return {
+        "count": count,
+        "default_rate": default_rate,
+        "auc": auc,
+        "f1": f1_from_counts(tp, fp, fn),
+        "cost": fp * cost_fp + fn * cost_fn,
+    }
+
+
+# P(X <= k) for X ~ Poisson(1), k = 0..7, scaled to uint32 for a table-lookup sampler
+_POISSON1_CDF_U32 = np.minimum(
+    np.cumsum([np.exp(-1) / np.prod(np.arange(1, k + 1)) for k in range(8)]) * 2**32, 2**32 - 1
+).astype(np.uint32)
+
+
+def _poisson1_weights(rng, shape):
+    """Poisson(1) resample counts as uint8 (truncated at 8, P(X > 8) ~ 1e-6)."""
+    u = rng.integers(0, 2**32, size=shape, dtype=np.uint32)
+    weights = np.zeros(shape, dtype=np.uint8)
+    for threshold in _POISSON1_CDF_U32:
+        weights += u >= threshold
+    return weights
+
+
+def _label_order(table, label):
+    """Row ids of one class in the table's descending-score order."""
+    y_sorted = np.diff(np.r_[0, table["cum_pos"]])
+    return table["order"][y_sorted == label]
+
+
+def _replicate_metrics(table, pos_weights, neg_weights, f1_threshold, cost_threshold, cost_fp, cost_fn):
+    # weights are laid out in the table's order of positives / negatives, so the
+    # unweighted tp/fp counts at each distinct threshold index straight into the cumsums
+    zeros = np.zeros((len(pos_weights), 1), dtype=np.int32)
+    cum_pos = np.hstack([zeros, np.cumsum(pos_weights, axis=1, dtype=np.int32)])
+    cum_neg = np.hstack([zeros, np.cumsum(neg_weights, axis=1, dtype=np.int32)])
+    tps = cum_pos[:, np.r_[0, table["tps"]]].astype(np.float64)
+    fps = cum_neg[:, np.r_[0, table["fps"]]].astype(np.float64)
+    n_pos, n_neg = tps[:, -1], fps[:, -1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        auc = np.sum(np.diff(fps, axis=1) * (tps[:, 1:] + tps[:, :-1]), axis=1) / (2 * n_pos * n_neg)
+
+    def at(threshold):
+        k = np.searchsorted(-table["thresholds"], -threshold, side="right")
+        return tps[:, k], fps[:, k]
+
+    tp, fp = at(f1_threshold)
+    f1 = f1_from_counts(tp, fp, n_pos - tp)
+    tp, fp = at(cost_threshold)
+    cost = fp * cost_fp + (n_pos - tp) * cost_fn
+    return {"roc_auc": auc, "f1_score": f1, "misclassification_cost": cost}
+
+
+def _summarise(estimate, samples, alpha):
+    samples = samples[np.isfinite(samples)]
+    low, high = np.quantile(samples, [alpha / 2, 1 - alpha / 2]) if len(samples) else (np.nan, np.nan)
+    return {"estimate": float(estimate), "low": float(low), "high": float(high), "std": float(np.std(samples))}
+
+
+def _point_metrics(table, f1_threshold, cost_threshold, cost_fp, cost_fn):
+    return {
+        "roc_auc": roc_auc(table),
+        "f1_score": f1_at(table, f1_threshold),
+        "misclassification_cost": float(cost_at(table, cost_threshold, cost_fp, cost_fn)[0]),
+    }
+
+
+def bootstrap_metrics(table, f1_threshold, cost_threshold, n_boot=200, reference=None,
+                      cost_fp=1000, cost_fn=900, alpha=0.05, seed=42, max_chunk_elements=20_000_000):
+    """Poisson-bootstrap CIs for AUC, F1 and cost, reusing the table's single sort.
+
+    Each replicate reweights rows with Poisson(1) counts instead of redrawing them,
+    so every replicate keeps the same sorted order and the curve counts are just
+    cumulative sums over a (replicates x rows) weight matrix, evaluated in chunks of
+    at most `max_chunk_elements`. `reference` = (table, f1_threshold, cost_threshold)
+    of another model scored on the same rows adds paired deltas (this model minus
+    the reference) computed on identical resamples. Thresholds are held fixed.
+    """
+    rng = np.random.default_rng(seed)
+    n_pos, n_neg = table["n_pos"], table["n_neg"]
+    chunk = max(1, min(n_boot, max_chunk_elements // max(n_pos + n_neg, 1)))
+
+    if reference is not None:
+        ref_table, ref_f1_threshold, ref_cost_threshold = reference
+        # position of every row within this table's positives / negatives, in the reference's order
+        perms = []
+        for label in (1, 0):
+            rank = np.empty(len(table["order"]), dtype=np.int64)
+            own = _label_order(table, label)
+            rank[own] = np.arange(len(own))
+            perms.append(rank[_label_order(ref_table, label)])
+
+    samples, ref_samples = {}, {}
+    for start in range(0, n_boot, chunk):
+        size = min(chunk, n_boot - start)
+        pos_weights = _poisson1_weights(rng, (size, n_pos))
+        neg_weights = _poisson1_weights(rng, (size, n_neg))
+        metrics = _replicate_metrics(table, pos_weights, neg_weights, f1_threshold, cost_threshold, cost_fp, cost_fn)
+        for name, values in metrics.items():
+            samples.setdefault(name, []).append(values)
+        if reference is not None:
+            ref_metrics = _replicate_metrics(
+                ref_table, pos_weights[:, perms[0]], neg_weights[:, perms[1]],
+                ref_f1_threshold, ref_cost_threshold, cost_fp, cost_fn
+            )
+            for name, values in ref_metrics.items():
+                ref_samples.setdefault(name, []).append(values)
+
+    point = _point_metrics(table, f1_threshold, cost_threshold, cost_fp, cost_fn)
+    result = {name: _summarise(point[name], np.concatenate(values), alpha) for name, values in samples.items()}
+
+    if reference is not None:
+        ref_point = _point_metrics(ref_table, ref_f1_threshold, ref_cost_threshold, cost_fp, cost_fn)
+        for name in samples:
+            delta = np.concatenate(samples[name]) - np.concatenate(ref_samples[name])
+            summary = _summarise(point[name] - ref_point[name], delta, alpha)
+            # share of resamples in which this model is not better than the reference
+            worse = delta >= 0 if name == "misclassification_cost" else delta <= 0
+            summary["p_not_better"] = float(np.mean(worse[np.isfinite(delta)]))
+            result[f"delta_{name}"] = summary
+    return result
@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from metrics_engine import build_score_table, roc_auc
+
+_worker = {}
+BATCH_ROWS = 4096
+
+
+def _init_worker(shm_name, shape, columns, y, model):
+    """Attaches the shared test matrix as a read-only view; nothing is copied up front."""
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    if "n_jobs" in getattr(model, "get_params", dict)():
+        model.set_params(n_jobs=1)
+
+    # the segment stays attached for the worker's lifetime since X views its buffer
+    shm = shared_memory.SharedMemory(name=shm_name)
+    X = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+    X.flags.writeable = False
+    _worker.update(shm=shm, X=X, columns=columns, y=y, model=model)
+
+
+def _predict(model, X, columns):
+    return model.predict_proba(pd.DataFrame(X, columns=columns, copy=False))[:, 1]
+
+
+def _score_permutation(task):
+    """Scores the matrix with one column shuffled, in row batches copied from the shared view.
+
+    Only the shuffled column and one BATCH_ROWS slice are private, so worker
+    memory does not grow with the size of the test set.
+    """
+    column, repeat, seed = task
+    X, columns = _worker["X"], _worker["columns"]
+    shuffled = X[:, column][np.random.default_rng([seed, column, repeat]).permutation(len(X))]
+    probas = np.empty(len(X))
+    for start in range(0, len(X), BATCH_ROWS):
+        batch = np.array(X[start:start + BATCH_ROWS])
+        batch[:, column] = shuffled[start:start + BATCH_ROWS]
+        probas[start:start + len(batch)] = _predict(_worker["model"], batch, columns)
+    return column, repeat, roc_auc(build_score_table(_worker["y"], probas))
+
+
+def permutation_importance(model, X_test, y_test, n_repeats=5, sample_rows=20000, max_workers=None, seed=42):
+    """Model-agnostic importance: drop in ROC-AUC when one column is shuffled.
+
+    The baseline is scored on the same float32 sample the permutations start
+    from. Every (column, repeat) pair is a task on a process pool whose workers
+    read the test matrix through shared memory.
+    """
+    columns = list(X_test.columns)
+    y = np.asarray(y_test)
+    X = np.asarray(X_test, dtype=np.float32)
+    if sample_rows and len(X) > sample_rows:
+        rows = np.sort(np.random.default_rng(seed).choice(len(X), sample_rows, replace=False))
+        X, y = X[rows], y[rows]
+    baseline_auc = roc_auc(build_score_table(y, _predict(model, X, columns)))
+
+    tasks = [(j, r, seed) for j in range(len(columns)) for r in range(n_repeats)]
+    max_workers = max_workers or min(os.cpu_count() or 1, len(tasks))
+    drops = np.zeros((len(columns), n_repeats))
+
+    shm = shared_memory.SharedMemory(create=True, size=X.nbytes)
+    try:
+        np.ndarray(X.shape, dtype=np.float32, buffer=shm.buf)[:] = X
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(shm.name, X.shape, columns, y, model)) as pool:
+            for column, repeat, auc in pool.map(_score_permutation, tasks,
+                                                chunksize=max(1, len(tasks) // (4 * max_workers))):
+                drops[column, repeat] = baseline_auc - auc
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return pd.DataFrame({
+        "feature": columns,
+        "importance_mean": drops.mean(axis=1),
+        "importance_std": drops.std(axis=1),
+        "baseline_roc_auc": baseline_auc,
+        "rows": len(y),
+        "repeats": n_repeats,
+    }).sort_values("importance_mean", ascending=False, ignore_index=True)
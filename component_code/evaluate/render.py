@@ -0,0 +1,115 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+MAX_CURVE_POINTS = 500
+MAX_SHAP_ROWS = 2000
+
+
+def downsample_curve(x, y, max_points=MAX_CURVE_POINTS):
+    """Keeps both end points and evenly spaced points in between."""
+    if len(x) <= max_points:
+        return x, y
+    idx = np.unique(np.linspace(0, len(x) - 1, max_points).round().astype(int))
+    return x[idx], y[idx]
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def render_confusion_matrix(cm, path):
+    import seaborn as sns
+    plt = _pyplot()
+    plt.figure(figsize=(6, 4))
+    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues')
+    plt.title("Confusion Matrix")
+    plt.xlabel("Predicted")
+    plt.ylabel("Actual")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def render_roc_curve(fpr, tpr, path):
+    plt = _pyplot()
+    plt.figure(figsize=(6, 4))
+    plt.plot(fpr, tpr, label='ROC Curve')
+    plt.plot([0, 1], [0, 1], 'k--')
+    plt.title("ROC Curve")
+    plt.xlabel("False Positive Rate")
+    plt.ylabel("True Positive Rate")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def render_pr_curve(recall, precision, path):
+    plt = _pyplot()
+    plt.figure(figsize=(6, 4))
+    plt.plot(recall, precision)
+    plt.title("Precision-Recall Curve")
+    plt.xlabel("Recall")
+    plt.ylabel("Precision")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+def render_shap_beeswarm(model, X_test, path):
+    try:
+        import shap
+        plt = _pyplot()
+        if len(X_test) > MAX_SHAP_ROWS:
+            X_test = X_test.sample(n=MAX_SHAP_ROWS, random_state=42)
+        explainer = shap.TreeExplainer(model)
+        shap_values = explainer.shap_values(X_test)
+        plt.figure(figsize=(10, 6))
+        shap.summary_plot(shap_values, X_test, show=False)
+        plt.tight_layout()
+        plt.savefig(path)
+        plt.close()
+        print("SHAP summary plot saved.")
+        return path
+    except Exception as e:
+        print(f"SHAP explainability failed: {e}")
+        return None
+
+
+RENDERERS = {
+    "confusion_matrix": render_confusion_matrix,
+    "roc_curve": render_roc_curve,
+    "pr_curve": render_pr_curve,
+    "shap_beeswarm": render_shap_beeswarm,
+}
+
+
+def _run_job(job):
+    kind, kwargs = job
+    return kind, RENDERERS[kind](**kwargs)
+
+
+def build_render_jobs(cm, roc, pr, model, X_test, output_path, max_points=MAX_CURVE_POINTS):
+    fpr, tpr = downsample_curve(*roc, max_points=max_points)
+    recall, precision = downsample_curve(*pr, max_points=max_points)
+    return [
+        ("confusion_matrix", {"cm": cm, "path": os.path.join(output_path, "confusion_matrix.png")}),
+        ("roc_curve", {"fpr": fpr, "tpr": tpr, "path": os.path.join(output_path, "roc_curve.png")}),
+        ("pr_curve", {"recall": recall, "precision": precision, "path": os.path.join(output_path, "pr_curve.png")}),
+        ("shap_beeswarm", {"model": model, "X_test": X_test, "path": os.path.join(output_path, "shap_beeswarm.png")}),
+    ]
+
+
+def render_artifacts(jobs, max_workers=None):
+    """Renders every job in its own worker process; returns {kind: path or None}."""
+    max_workers = max_workers or min(len(jobs), os.cpu_count() or 1)
+    if max_workers <= 1:
+        return dict(_run_job(job) for job in jobs)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return dict(pool.map(_run_job, jobs))
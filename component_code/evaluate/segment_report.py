@@ -0,0 +1,69 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from metrics_engine import grouped_metrics
+
+AGE_BINS = [0, 25, 35, 45, 55, 65, np.inf]
+LIMIT_BAL_BINS = [0, 50_000, 100_000, 200_000, 500_000, np.inf]
+
+
+def load_raw_features(input_data, X_test):
+    """Undoes the preprocess scaling so segments are cut on the original units."""
+    scaler_path = os.path.join(input_data, "scaler.pkl")
+    if not os.path.exists(scaler_path):
+        return X_test
+    scaler = joblib.load(scaler_path)
+    return pd.DataFrame(scaler.inverse_transform(X_test), columns=X_test.columns, index=X_test.index)
+
+
+def band_labels(bins):
+    return [f"{lo:g}+" if np.isinf(hi) else f"{lo:g}-{hi:g}" for lo, hi in zip(bins[:-1], bins[1:])]
+
+
+def segment_codes(X_raw):
+    """Maps every segmentation dimension to (integer codes, labels)."""
+    segments = {}
+    for col in ["sex", "education", "marriage"]:
+        if col in X_raw:
+            codes, labels = pd.factorize(X_raw[col].round().astype(int), sort=True)
+            segments[col] = (codes, [str(v) for v in labels])
+    if "age" in X_raw:
+        codes = pd.cut(X_raw["age"], AGE_BINS, right=False, labels=band_labels(AGE_BINS))
+        segments["age_bucket"] = (codes.cat.codes.to_numpy(), list(codes.cat.categories))
+    if "limit_bal" in X_raw:
+        codes = pd.cut(X_raw["limit_bal"], LIMIT_BAL_BINS, right=False, labels=band_labels(LIMIT_BAL_BINS))
+        segments["limit_bal_band"] = (codes.cat.codes.to_numpy(), list(codes.cat.categories))
+    return segments
+
+
+def build_segment_report(X_raw, y_true, probas, threshold, cost_fp=1000, cost_fn=900):
+    segments = segment_codes(X_raw)
+    y = np.asarray(y_true)
+    probas = np.asarray(probas)
+
+    # stack every dimension into one id space so a single grouped pass covers all slices
+    ids, dims, labels = [], [], []
+    offset = 0
+    for dim, (codes, names) in segments.items():
+        ids.append(np.where(codes >= 0, codes + offset, -1))
+        dims.extend([dim] * len(names))
+        labels.extend(names)
+        offset += len(names)
+    group_ids = np.concatenate(ids)
+    repeats = len(segments)
+    valid = group_ids >= 0
+
+    metrics = grouped_metrics(
+        group_ids[valid], offset,
+        np.tile(y, repeats)[valid], np.tile(probas, repeats)[valid],
+        threshold, cost_fp, cost_fn
+    )
+    report = pd.DataFrame({"dimension": dims, "segment": labels, **metrics})
+    return report[report["count"] > 0].reset_index(drop=True)
+
+
+def write_segment_report(report, output_path):
+    report_path = os.path.join(output_path, "segment_report.csv")
+    report.round(4).to_csv(report_path, index=False)
+    return report_path
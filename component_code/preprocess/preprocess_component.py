@@ -2,16 +2,66 @@ import argparse
 import pandas as pd
 import numpy as np
 import os
+import json
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 import joblib
 import mlflow
+from profiling import DataProfile, load_expectations, validate_profile
 
-def load_data(file_path):
-    df = pd.read_excel(file_path, header=1)
+PROFILE_CHUNK_ROWS = 50000
+DEFAULT_EXPECTATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "expectations.json")
+
+def normalise_columns(df):
     df.rename(columns=lambda x: x.strip().lower().replace(" ", "_"), inplace=True)
     return df
 
+def load_partitions(folder_path, profile=None):
+    files = sorted(
+        os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(".parquet")
+    )
+    if not files:
+        raise FileNotFoundError(f"No Parquet partitions found in: {folder_path}")
+
+    def read_partition(path):
+        part = normalise_columns(pd.read_parquet(path))
+        if profile is not None:
+            profile.update(part)
+        return part
+
+    with ThreadPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as pool:
+        return pd.concat(list(pool.map(read_partition, files)), ignore_index=True)
+
+def load_data(file_path, profile=None):
+    if os.path.isdir(file_path):
+        return load_partitions(file_path, profile)
+    df = normalise_columns(pd.read_excel(file_path, header=1))
+    if profile is not None:
+        for start in range(0, len(df), PROFILE_CHUNK_ROWS):
+            profile.update(df.iloc[start:start + PROFILE_CHUNK_ROWS])
+    return df
+
+def run_validation_gate(profile, expectations, output_dir):
+    """Writes profile_report.json and fails before any feature work if the data breaks expectations."""
+    report = profile.to_dict()
+    report["violations"] = validate_profile(report, expectations)
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, "profile_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    mlflow.log_artifact(report_path)
+    mlflow.log_metric("rows_dropped_by_cleaning", report["rows_dropped_by_cleaning"])
+    print(f"Profiled {report['rows']} rows x {len(report['columns'])} columns; "
+          f"{report['rows_dropped_by_cleaning']} rows have education/marriage == 0 or nulls and will be dropped.")
+    if report["violations"]:
+        shown = report["violations"][:10]
+        more = len(report["violations"]) - len(shown)
+        raise ValueError("Input data failed validation:\n  - " + "\n  - ".join(shown)
+                         + (f"\n  ... and {more} more (see profile_report.json)" if more else ""))
+    return report_path
+
 def clean_data(df):
     df.drop(columns=['id'], inplace=True, errors='ignore')
     df['education'] = df['education'].replace(0, np.nan)
@@ -37,6 +87,36 @@ def feature_engineering(df):
 
     return X_scaled, y, scaler
 
+def build_drift_reference(X, n_bins=10):
+    """Reference bin edges and proportions per feature, in the units the endpoint receives."""
+    features = {}
+    for col in X.columns:
+        values = X[col].to_numpy(dtype=np.float64)
+        values = values[~np.isnan(values)]
+        inner_edges = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(inner_edges, values, side="right"), minlength=len(inner_edges) + 1)
+        features[col] = {
+            "edges": inner_edges.tolist(),
+            "proportions": (counts / max(counts.sum(), 1)).tolist(),
+        }
+    return {"n_rows": len(X), "features": features}
+
+def export_feature_store(X, ids, output_dir):
+    """Writes the scaled feature matrix sorted by account ID as memory-mappable .npy files."""
+    keys = np.asarray(ids, dtype=np.int64)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    if len(keys) > 1 and np.any(keys[1:] == keys[:-1]):
+        raise ValueError("Duplicate account IDs; cannot build the feature store.")
+
+    store_dir = os.path.join(output_dir, "feature_store")
+    os.makedirs(store_dir, exist_ok=True)
+    np.save(os.path.join(store_dir, "keys.npy"), keys)
+    np.save(os.path.join(store_dir, "features.npy"), np.ascontiguousarray(X.to_numpy(dtype=np.float32)[order]))
+    with open(os.path.join(store_dir, "meta.json"), "w") as f:
+        json.dump({"columns": list(X.columns), "n_rows": len(keys), "dtype": "float32"}, f)
+    return store_dir
+
 def split_and_save(X, y, output_dir):
     X_train, X_temp, y_train, y_temp = train_test_split(X, y, test_size=0.3, random_state=42, stratify=y)
     X_val, X_test, y_val, y_test = train_test_split(X_temp, y_temp, test_size=0.5, random_state=42, stratify=y_temp)
@@ -54,13 +134,28 @@ def split_and_save(X, y, output_dir):
     }
 
 def main(args):
-    df = load_data(args.input_data)
+    profile = DataProfile(load_expectations(args.expectations))
+    df = load_data(args.input_partitions or args.input_data, profile)
+    if args.skip_validation:
+        print("Validation gate skipped (--skip_validation).")
+    else:
+        run_validation_gate(profile, profile.expectations, args.output_path)
+    ids = df['id'].copy() if 'id' in df.columns else None
     df = clean_data(df)
     X, y, scaler = feature_engineering(df)
     split_stats = split_and_save(X, y, args.output_path)
+    feature_store_dir = None
+    if ids is not None:
+        # clean_data drops rows but keeps the index, and y carries that index
+        feature_store_dir = export_feature_store(X, ids.loc[y.index].to_numpy(), args.output_path)
     scaler_path = os.path.join(args.output_path, "scaler.pkl")
     joblib.dump(scaler, scaler_path)
 
+    drift_reference = build_drift_reference(df[X.columns])
+    drift_reference_path = os.path.join(args.output_path, "drift_reference.json")
+    with open(drift_reference_path, "w") as f:
+        json.dump(drift_reference, f)
+
     
     mlflow.log_param("scaler", "StandardScaler")
     mlflow.log_param("num_rows", len(df))
@@ -76,12 +171,22 @@ def main(args):
 
     
     mlflow.log_artifact(scaler_path)
+    mlflow.log_artifact(drift_reference_path)
+    if feature_store_dir:
+        mlflow.log_metric("feature_store_rows", len(X))
 
     print("Preprocessing complete and parameters logged with MLflow.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--input_data", type=str, required=True)
+    parser.add_argument("--input_data", type=str, default=None)
+    parser.add_argument("--input_partitions", type=str, default=None,
+                        help="Folder of Parquet partitions registered by data_upload.py --partition_rows")
     parser.add_argument("--output_path", type=str, required=True)
+    parser.add_argument("--expectations", type=str, default=DEFAULT_EXPECTATIONS,
+                        help="JSON expectations profile the raw data is validated against")
+    parser.add_argument("--skip_validation", type=lambda v: str(v).lower() == "true", default=False)
     args = parser.parse_args()
+    if not (args.input_data or args.input_partitions):
+        parser.error("one of --input_data or --input_partitions is required")
     main(args)
@@ -0,0 +1,175 @@
+import json
+import threading
+import numpy as np
+import pandas as pd
+
+MAX_TRACKED_CATEGORIES = 50
+CLEANING_ZERO_COLUMNS = ("education", "marriage")
+
+
+class ColumnProfile:
+    """Mergeable one-pass stats for one column: nulls, min/max, mean/variance, histogram, categories."""
+
+    def __init__(self, edges=None, track_categories=True):
+        self.edges = np.asarray(edges, dtype=np.float64) if edges is not None else None
+        self.count = 0
+        self.nulls = 0
+        self.non_numeric = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.histogram = np.zeros(len(self.edges) + 1, dtype=np.int64) if self.edges is not None else None
+        self.categories = {} if track_categories else None
+
+    def update(self, series):
+        nulls = int(series.isna().sum())
+        values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+        values = values[~np.isnan(values)]
+        other = ColumnProfile(self.edges, self.categories is not None)
+        other.nulls = nulls
+        other.non_numeric = len(series) - nulls - len(values)
+        other.count = len(values)
+        if len(values):
+            other.min, other.max = float(values.min()), float(values.max())
+            other.mean = float(values.mean())
+            other.m2 = float(np.sum((values - other.mean) ** 2))
+            if other.histogram is not None:
+                other.histogram += np.bincount(np.searchsorted(self.edges, values, side="right"),
+                                               minlength=len(self.edges) + 1)
+            if other.categories is not None:
+                uniques, counts = np.unique(values, return_counts=True)
+                if len(uniques) <= MAX_TRACKED_CATEGORIES:
+                    other.categories = dict(zip(uniques.tolist(), counts.tolist()))
+                else:
+                    other.categories = None
+        return other
+
+    def merge(self, other):
+        # Chan et al. pairwise update, so partitions can be profiled independently
+        total = self.count + other.count
+        if total:
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta ** 2 * self.count * other.count / total
+            self.mean += delta * other.count / total
+        self.count = total
+        self.nulls += other.nulls
+        self.non_numeric += other.non_numeric
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if self.histogram is not None:
+            self.histogram += other.histogram
+        if self.categories is not None:
+            if other.categories is None:
+                self.categories = None
+            else:
+                for value, n in other.categories.items():
+                    self.categories[value] = self.categories.get(value, 0) + n
+                if len(self.categories) > MAX_TRACKED_CATEGORIES:
+                    self.categories = None
+
+    def to_dict(self):
+        rows = self.count + self.nulls + self.non_numeric
+        summary = {
+            "count": self.count,
+            "nulls": self.nulls,
+            "null_rate": self.nulls / rows if rows else 0.0,
+            "non_numeric": self.non_numeric,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "mean": self.mean if self.count else None,
+            "std": float(np.sqrt(self.m2 / self.count)) if self.count else None,
+        }
+        if self.histogram is not None:
+            summary["histogram"] = {"edges": self.edges.tolist(), "counts": self.histogram.tolist()}
+        if self.categories is not None:
+            summary["categories"] = {str(int(v) if float(v).is_integer() else v): n
+                                     for v, n in sorted(self.categories.items())}
+        return summary
+
+
+class DataProfile:
+    """Profiles the raw frame chunk by chunk as it is loaded; thread-safe, so partitions can feed it concurrently."""
+
+    def __init__(self, expectations=None):
+        self.expectations = expectations or {}
+        self.columns = {}
+        self.rows = 0
+        self.rows_dropped_by_cleaning = 0
+        self._lock = threading.Lock()
+
+    def _new_column(self, name):
+        spec = self.expectations.get("columns", {}).get(name, {})
+        return ColumnProfile(spec.get("edges"), track_categories="edges" not in spec)
+
+    def update(self, chunk):
+        with self._lock:
+            templates = {name: self.columns.get(name) or self._new_column(name) for name in chunk.columns}
+        partial = {name: templates[name].update(chunk[name]) for name in chunk.columns}
+
+        # the same rows clean_data() removes: zero education/marriage codes and any nulls
+        dropped = chunk.drop(columns=["id"], errors="ignore").isna().any(axis=1)
+        for col in CLEANING_ZERO_COLUMNS:
+            if col in chunk.columns:
+                dropped |= chunk[col] == 0
+
+        with self._lock:
+            for name, column in partial.items():
+                if name not in self.columns:
+                    self.columns[name] = templates[name]
+                self.columns[name].merge(column)
+            self.rows += len(chunk)
+            self.rows_dropped_by_cleaning += int(dropped.sum())
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "rows_dropped_by_cleaning": self.rows_dropped_by_cleaning,
+            "columns": {name: column.to_dict() for name, column in self.columns.items()},
+        }
+
+
+def load_expectations(path):
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def validate_profile(profile, expectations):
+    """Returns a list of human-readable violations; empty means the data passed."""
+    violations = []
+    rows = profile["rows"]
+    if rows < expectations.get("min_rows", 0):
+        violations.append(f"only {rows} rows, expected at least {expectations['min_rows']}")
+    max_dropped = expectations.get("max_dropped_rate")
+    if max_dropped is not None and rows and profile["rows_dropped_by_cleaning"] / rows > max_dropped:
+        violations.append(f"{profile['rows_dropped_by_cleaning']} rows ({profile['rows_dropped_by_cleaning'] / rows:.1%}) "
+                          f"would be dropped by cleaning, above {max_dropped:.1%}")
+
+    for name, spec in expectations.get("columns", {}).items():
+        column = profile["columns"].get(name)
+        if column is None:
+            violations.append(f"{name}: missing column")
+            continue
+        if column["non_numeric"]:
+            violations.append(f"{name}: {column['non_numeric']} non-numeric values")
+        if column["null_rate"] > spec.get("max_null_rate", 0.0):
+            violations.append(f"{name}: {column['nulls']} nulls ({column['null_rate']:.3%}), "
+                              f"allowed {spec.get('max_null_rate', 0.0):.3%}")
+        if column["count"] == 0:
+            continue
+        if "min" in spec and column["min"] < spec["min"]:
+            violations.append(f"{name}: min {column['min']:g} below {spec['min']:g}")
+        if "max" in spec and column["max"] > spec["max"]:
+            violations.append(f"{name}: max {column['max']:g} above {spec['max']:g}")
+        if "categories" in spec:
+            seen = column.get("categories")
+            if seen is None:
+                violations.append(f"{name}: more than {MAX_TRACKED_CATEGORIES} distinct values, expected categorical")
+            else:
+                allowed = {str(c) for c in spec["categories"]}
+                unexpected = {v: n for v, n in seen.items() if v not in allowed}
+                if unexpected:
+                    violations.append(f"{name}: unexpected values {unexpected}")
+    return violations
@@ -0,0 +1,61 @@
+import os
+import json
+import numpy as np
+
+FOREST_FORMAT = "flat-forest-v1"
+
+
+def _trees(estimator):
+    if hasattr(estimator, "estimators_") and hasattr(estimator.estimators_[0], "tree_"):
+        return [e.tree_ for e in estimator.estimators_]
+    if hasattr(estimator, "tree_"):
+        return [estimator.tree_]
+    return None
+
+
+def export_flat_forest(estimator, output_dir):
+    """Writes a sklearn tree/forest classifier as flat .npy node arrays that serving can memory-map.
+
+    sklearn's Tree objects copy their nodes into private memory on unpickling, so
+    every worker holds its own copy. Here all trees are concatenated into one set
+    of arrays (global child indices, leaves point at themselves) plus the positive
+    class probability at every node. Returns None for non-tree models.
+    """
+    trees = _trees(estimator)
+    if trees is None or len(getattr(estimator, "classes_", [])) != 2:
+        return None
+
+    offsets = np.cumsum([0] + [t.node_count for t in trees])
+    feature, threshold, left, right, proba = [], [], [], [], []
+    for offset, tree in zip(offsets, trees):
+        value = tree.value[:, 0, :]
+        is_leaf = tree.children_left < 0
+        own = offset + np.arange(tree.node_count)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        left.append(np.where(is_leaf, own, offset + tree.children_left))
+        right.append(np.where(is_leaf, own, offset + tree.children_right))
+        proba.append(value[:, 1] / np.maximum(value.sum(axis=1), 1e-12))
+
+    forest_dir = os.path.join(output_dir, "forest")
+    os.makedirs(forest_dir, exist_ok=True)
+    arrays = {
+        "roots": offsets[:-1].astype(np.int64),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "left": np.concatenate(left).astype(np.int64),
+        "right": np.concatenate(right).astype(np.int64),
+        "proba": np.concatenate(proba).astype(np.float64),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(forest_dir, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(forest_dir, "meta.json"), "w") as f:
+        json.dump({
+            "format": FOREST_FORMAT,
+            "n_trees": len(trees),
+            "n_nodes": int(offsets[-1]),
+            "max_depth": int(max(t.max_depth for t in trees)),
+            "feature_names": [str(c) for c in getattr(estimator, "feature_names_in_", [])],
+            "classes": [int(c) for c in estimator.classes_],
+        }, f)
+    return forest_dir
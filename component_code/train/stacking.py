@@ -0,0 +1,86 @@
+import numpy as np
+from scipy.special import expit, logit
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import f1_score
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+
+EPS = 1e-6
+
+
+def to_logits(probas):
+    return logit(np.clip(np.asarray(probas, dtype=np.float64), EPS, 1 - EPS))
+
+
+def fit_meta_model(oof_probas, y, sample_weight=None, class_weight=None):
+    """Logistic regression on the logits of the base models' out-of-fold P(default), one column per model."""
+    meta_model = LogisticRegression(class_weight=class_weight)
+    return meta_model.fit(to_logits(oof_probas), np.asarray(y), sample_weight=sample_weight)
+
+
+def meta_cv_f1(oof_probas, y, sample_weight=None, class_weight=None, cv=3):
+    """Cross-validated F1 of the meta-model, comparable with the base models' search scores."""
+    y = np.asarray(y)
+    predictions = np.empty(len(y), dtype=bool)
+    for train_idx, test_idx in StratifiedKFold(n_splits=cv).split(oof_probas, y):
+        weights = sample_weight[train_idx] if sample_weight is not None else None
+        meta_model = fit_meta_model(oof_probas[train_idx], y[train_idx], weights, class_weight)
+        predictions[test_idx] = meta_model.predict_proba(to_logits(oof_probas[test_idx]))[:, 1] > 0.5
+    return f1_score(y, predictions, sample_weight=sample_weight)
+
+
+class StackedEnsemble(ClassifierMixin, BaseEstimator):
+    """Fitted base classifiers combined by a logistic regression on their P(default) logits.
+
+    Built with `from_fitted` from the out-of-fold predictions the hyperparameter
+    search already produced, so stacking costs no extra base-model fits.
+    predict_proba scores each base model once on the whole batch, then applies
+    the meta-model as a single dot product.
+    """
+
+    def __init__(self, base_models=None, cv=3, class_weight=None):
+        self.base_models = base_models
+        self.cv = cv
+        self.class_weight = class_weight
+
+    @classmethod
+    def from_fitted(cls, base_models, oof_probas, y, sample_weight=None, class_weight=None):
+        ensemble = cls(base_models=base_models, class_weight=class_weight)
+        ensemble.base_models_ = list(base_models)
+        ensemble.meta_model_ = fit_meta_model(oof_probas, y, sample_weight, class_weight)
+        ensemble._set_fitted_attributes()
+        return ensemble
+
+    def fit(self, X, y, sample_weight=None):
+        fit_params = {"sample_weight": sample_weight} if sample_weight is not None else {}
+        oof_probas = np.column_stack([
+            cross_val_predict(clone(model), X, y, cv=self.cv, method="predict_proba", params=fit_params)[:, 1]
+            for _, model in self.base_models
+        ])
+        self.base_models_ = [(name, clone(model).fit(X, y, **fit_params)) for name, model in self.base_models]
+        self.meta_model_ = fit_meta_model(oof_probas, y, sample_weight, self.class_weight)
+        self._set_fitted_attributes()
+        return self
+
+    def _set_fitted_attributes(self):
+        first = self.base_models_[0][1]
+        self.classes_ = first.classes_
+        self.n_features_in_ = first.n_features_in_
+        if hasattr(first, "feature_names_in_"):
+            self.feature_names_in_ = first.feature_names_in_
+        self.meta_coef_ = self.meta_model_.coef_[0].astype(np.float64)
+        self.meta_intercept_ = float(self.meta_model_.intercept_[0])
+
+    @property
+    def weights(self):
+        return {name: float(w) for (name, _), w in zip(self.base_models_, self.meta_coef_)}
+
+    def predict_proba(self, X):
+        logits = np.empty((len(X), len(self.base_models_)))
+        for i, (_, model) in enumerate(self.base_models_):
+            logits[:, i] = to_logits(model.predict_proba(X)[:, 1])
+        p = expit(logits @ self.meta_coef_ + self.meta_intercept_)
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
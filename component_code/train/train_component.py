@@ -1,8 +1,13 @@
 import argparse
 import os
+import time
+import json
+import shutil
 import joblib
 import numpy as np
-from sklearn.model_selection import RandomizedSearchCV
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import ParameterSampler, StratifiedKFold
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LogisticRegression
 from xgboost import XGBClassifier
@@ -13,34 +18,90 @@ from sklearn.metrics import (
 from scipy.stats import randint, uniform
 import mlflow
 import mlflow.sklearn
+from forest_export import export_flat_forest
+from stacking import StackedEnsemble, meta_cv_f1
+
+STACKING_CODE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stacking.py")
 
 def load_data(processed_path):
     X_train, y_train = joblib.load(os.path.join(processed_path, "train.pkl"))
     X_val, y_val = joblib.load(os.path.join(processed_path, "val.pkl"))
     return X_train, y_train, X_val, y_val
 
-def tune_model(model, param_dist, X_train, y_train):
-    search = RandomizedSearchCV(
-        model,
-        param_distributions=param_dist,
-        n_iter=20,
-        scoring='f1',
-        cv=3,
-        verbose=1,
-        n_jobs=-1,
-        random_state=42
+def bundle_drift_reference(processed_path, output_path, val_predictions, n_bins=10):
+    """Adds the validation prediction distribution to the preprocess feature profile."""
+    reference_path = os.path.join(processed_path, "drift_reference.json")
+    if not os.path.exists(reference_path):
+        return None
+    with open(reference_path) as f:
+        reference = json.load(f)
+
+    inner_edges = np.linspace(0, 1, n_bins + 1)[1:-1]
+    counts = np.bincount(
+        np.searchsorted(inner_edges, np.asarray(val_predictions, dtype=np.float64), side="right"),
+        minlength=n_bins
     )
-    search.fit(X_train, y_train)
-    return search.best_estimator_, search.best_params_, search.best_score_
+    reference["prediction"] = {"edges": inner_edges.tolist(), "proportions": (counts / counts.sum()).tolist()}
 
-def main(args):
-    X_train, y_train, X_val, y_val = load_data(args.input_data)
+    bundled_path = os.path.join(output_path, "drift_reference.json")
+    with open(bundled_path, "w") as f:
+        json.dump(reference, f)
+    return bundled_path
 
-    
-    scale_pos_weight = len(y_train[y_train == 0]) / len(y_train[y_train == 1])
-    mlflow.log_param("scale_pos_weight", scale_pos_weight)
+def package_model(best_model, processed_path, output_path, val_predictions):
+    """Saves the MLflow model plus everything the endpoint loads from next to MLmodel."""
+    model_dir = os.path.join(output_path, "mlflow_model")
+    shutil.rmtree(model_dir, ignore_errors=True)
+    # the ensemble's class ships with the model so evaluate and serving can unpickle it
+    code_paths = [STACKING_CODE] if isinstance(best_model, StackedEnsemble) else None
+    mlflow.sklearn.save_model(best_model, model_dir, code_paths=code_paths)
+    bundle_drift_reference(processed_path, model_dir, val_predictions)
+    feature_store_dir = os.path.join(processed_path, "feature_store")
+    if os.path.isdir(feature_store_dir):
+        shutil.copytree(feature_store_dir, os.path.join(model_dir, "feature_store"))
+    export_flat_forest(best_model, model_dir)
+    return model_dir
+
+def tune_model(model, param_dist, X_train, y_train, sample_weight=None, refit=True, n_iter=20, cv=3):
+    """Randomized search that also returns the best configuration's out-of-fold P(default).
 
-    print("Tuning XGBoost...")
+    Same candidates, stratified folds and mean per-fold F1 as RandomizedSearchCV(n_iter=20, cv=3),
+    but each (candidate, fold) fit predicts its held-out fold, so stacking needs no extra fits.
+    Weights are applied both to the fits and to the fold F1, so a downsampled search estimates full-data F1.
+    """
+    y = np.asarray(y_train)
+    folds = list(StratifiedKFold(n_splits=cv).split(X_train, y))
+    candidates = list(ParameterSampler(param_dist, n_iter=n_iter, random_state=42))
+
+    def fit_fold(params, train_idx, test_idx):
+        estimator = clone(model).set_params(**params)
+        fit_params = {"sample_weight": sample_weight[train_idx]} if sample_weight is not None else {}
+        estimator.fit(X_train.iloc[train_idx], y[train_idx], **fit_params)
+        return estimator.predict_proba(X_train.iloc[test_idx])[:, 1]
+
+    print(f"Fitting {cv} folds for each of {len(candidates)} candidates, totalling {cv * len(candidates)} fits")
+    fold_probas = Parallel(n_jobs=-1)(
+        delayed(fit_fold)(params, train_idx, test_idx) for params in candidates for train_idx, test_idx in folds
+    )
+
+    def fold_f1(probas, test_idx):
+        weights = sample_weight[test_idx] if sample_weight is not None else None
+        return f1_score(y[test_idx], probas > 0.5, sample_weight=weights)
+
+    scores = [np.mean([fold_f1(fold_probas[i * cv + j], test_idx) for j, (_, test_idx) in enumerate(folds)])
+              for i in range(len(candidates))]
+    best = int(np.argmax(scores))
+    oof_probas = np.empty(len(y))
+    for j, (_, test_idx) in enumerate(folds):
+        oof_probas[test_idx] = fold_probas[best * cv + j]
+
+    best_model = None
+    if refit:
+        fit_params = {"sample_weight": sample_weight} if sample_weight is not None else {}
+        best_model = clone(model).set_params(**candidates[best]).fit(X_train, y_train, **fit_params)
+    return best_model, candidates[best], scores[best], oof_probas
+
+def build_candidates(scale_pos_weight, class_weight):
     xgb = XGBClassifier(
         use_label_encoder=False,
         eval_metric="logloss",
@@ -53,31 +114,119 @@ def main(args):
         'subsample': uniform(0.5, 0.5),
         'colsample_bytree': uniform(0.5, 0.5)
     }
-    xgb_best, xgb_best_params, xgb_score = tune_model(xgb, xgb_params, X_train, y_train)
-
-    print("\nTuning RandomForest...")
-    rf = RandomForestClassifier(class_weight='balanced')  
+    rf = RandomForestClassifier(class_weight=class_weight)  
     rf_params = {
         'n_estimators': randint(50, 300),
         'max_depth': randint(3, 20),
         'max_features': ['sqrt', 'log2']
     }
-    rf_best, rf_best_params, rf_score = tune_model(rf, rf_params, X_train, y_train)
-
-    print("\n🔍 Tuning LogisticRegression...")
-    lr = LogisticRegression(solver='liblinear', class_weight='balanced')  
+    lr = LogisticRegression(solver='liblinear', class_weight=class_weight)  
     lr_params = {
         'C': uniform(0.01, 10),
         'penalty': ['l1', 'l2']
     }
-    lr_best, lr_best_params, lr_score = tune_model(lr, lr_params, X_train, y_train)
+    return {'XGBoost': (xgb, xgb_params), 'RandomForest': (rf, rf_params), 'LogisticRegression': (lr, lr_params)}
+
+def search_models(candidates, X, y, sample_weight=None, refit=True):
+    """Tunes every family; returns the best family name and {name: (estimator, params, cv_f1, oof_probas)}."""
+    results = {}
+    for name, (model, param_dist) in candidates.items():
+        print(f"\nTuning {name}...")
+        results[name] = tune_model(model, param_dist, X, y, sample_weight, refit)
+    best_name = max(results, key=lambda name: results[name][2])
+    return best_name, results
+
+def downsample_negatives(X, y, rate, seed=42):
+    """Keeps every defaulter and a `rate` share of non-defaulters, weighted 1/rate to restore their mass."""
+    labels = np.asarray(y)
+    keep = (labels == 1) | (np.random.default_rng(seed).random(len(labels)) < rate)
+    weights = np.where(labels[keep] == 1, 1.0, 1.0 / rate)
+    return X.iloc[keep], y.iloc[keep], weights
+
+def stack_models(results, candidates, best_name, best_model, X_train, y_train, y_search, search_weights,
+                 class_weight):
+    """Meta-model over every family's out-of-fold predictions; None unless its CV F1 beats the best single model.
+
+    Base models come from the search; only a downsampled search, which skips
+    refitting, needs the non-winning families fitted on the full training set.
+    """
+    names = list(results)
+    oof_probas = np.column_stack([results[name][3] for name in names])
+    stack_score = meta_cv_f1(oof_probas, y_search, search_weights, class_weight)
+    print(f"Stacked ensemble CV F1: {stack_score:.4f} (best single model {best_name}: {results[best_name][2]:.4f})")
+    mlflow.log_metric("stack_cv_f1", stack_score)
+    if stack_score <= results[best_name][2]:
+        return None
+
+    base_models = []
+    for name in names:
+        fitted = best_model if name == best_name else results[name][0]
+        if fitted is None:
+            print(f"Refitting {name} on the full training set...")
+            fitted = clone(candidates[name][0]).set_params(**results[name][1]).fit(X_train, y_train)
+        base_models.append((name, fitted))
+    ensemble = StackedEnsemble.from_fitted(base_models, oof_probas, y_search, search_weights, class_weight)
+    return ensemble, stack_score
+
+def validation_scores(model, X_val, y_val):
+    return f1_score(y_val, model.predict(X_val)), roc_auc_score(y_val, model.predict_proba(X_val)[:, 1])
+
+def main(args):
+    X_train, y_train, X_val, y_val = load_data(args.input_data)
+
+    
+    scale_pos_weight = len(y_train[y_train == 0]) / len(y_train[y_train == 1])
+    mlflow.log_param("scale_pos_weight", scale_pos_weight)
+    # 'balanced' weights fixed from the full training labels, so a downsampled search
+    # with importance weights sees the same effective class balance as a full one
+    class_weight = {0: len(y_train) / (2 * (y_train == 0).sum()), 1: len(y_train) / (2 * (y_train == 1).sum())}
+    candidates = build_candidates(scale_pos_weight, class_weight)
+
+    start = time.perf_counter()
+    y_search, search_weights = y_train, None
+    if args.neg_sample_rate < 1:
+        X_search, y_search, search_weights = downsample_negatives(X_train, y_train, args.neg_sample_rate)
+        print(f"Searching on {len(y_search)}/{len(y_train)} rows: non-defaulters sampled at "
+              f"{args.neg_sample_rate:.0%} and weighted x{1 / args.neg_sample_rate:.2f}")
+        best_name, results = search_models(candidates, X_search, y_search, search_weights, refit=False)
+        search_time = time.perf_counter() - start
+        _, best_params, best_score, _ = results[best_name]
+        print(f"Refitting {best_name} on the full training set...")
+        best_model = clone(candidates[best_name][0]).set_params(**best_params).fit(X_train, y_train)
+        mlflow.log_param("neg_sample_rate", args.neg_sample_rate)
+        mlflow.log_metric("search_rows", len(y_search))
+    else:
+        best_name, results = search_models(candidates, X_train, y_train)
+        search_time = time.perf_counter() - start
+        best_model, best_params, best_score, _ = results[best_name]
+
+    if args.stack:
+        stacked = stack_models(results, candidates, best_name, best_model, X_train, y_train, y_search,
+                               search_weights, class_weight)
+        if stacked is not None:
+            best_model, best_score = stacked
+            best_name = "StackedEnsemble"
+            best_params = {f"stack_weight_{name}": weight for name, weight in best_model.weights.items()}
+    total_time = time.perf_counter() - start
+    print(f"Search took {search_time:.1f}s ({total_time:.1f}s including refit)")
+    mlflow.log_metric("search_time_s", search_time)
+    mlflow.log_metric("train_time_s", total_time)
 
-   
-    scores = {'XGBoost': xgb_score, 'RandomForest': rf_score, 'LogisticRegression': lr_score}
-    best_name = max(scores, key=scores.get)
-    best_model = {'XGBoost': xgb_best, 'RandomForest': rf_best, 'LogisticRegression': lr_best}[best_name]
-    best_score = scores[best_name]
-    best_params = {'XGBoost': xgb_best_params, 'RandomForest': rf_best_params, 'LogisticRegression': lr_best_params}[best_name]
+    if args.neg_sample_rate < 1 and args.compare_full_search:
+        print("\nRunning the full-data search for comparison...")
+        start = time.perf_counter()
+        full_name, full_results = search_models(candidates, X_train, y_train)
+        full_time = time.perf_counter() - start
+        f1_sampled, auc_sampled = validation_scores(best_model, X_val, y_val)
+        f1_full, auc_full = validation_scores(full_results[full_name][0], X_val, y_val)
+        print(f"Downsampled search: {best_name}, {total_time:.1f}s, val F1 {f1_sampled:.4f}, AUC {auc_sampled:.4f}")
+        print(f"Full search:        {full_name}, {full_time:.1f}s, val F1 {f1_full:.4f}, AUC {auc_full:.4f}")
+        print(f"Speedup x{full_time / total_time:.2f}; F1 delta {f1_sampled - f1_full:+.4f}, AUC delta {auc_sampled - auc_full:+.4f}")
+        mlflow.log_param("full_search_selected_model", full_name)
+        mlflow.log_metric("full_search_time_s", full_time)
+        mlflow.log_metric("search_speedup", full_time / total_time)
+        mlflow.log_metric("val_f1_delta_vs_full_search", f1_sampled - f1_full)
+        mlflow.log_metric("val_roc_auc_delta_vs_full_search", auc_sampled - auc_full)
 
     print(f"\n Selected Model: {best_name} with F1: {round(best_score, 4)}")
 
@@ -107,7 +256,11 @@ def main(args):
     mlflow.log_metric("val_recall", recall)
     mlflow.log_metric("val_roc_auc", roc_auc)
     mlflow.log_artifact(conf_matrix_file)
-    mlflow.sklearn.log_model(best_model, artifact_path="model", registered_model_name="credit-default-model")
+    # logged as the run's model; evaluate registers it only if it beats the production model
+    # the drift reference profiles P(default), the same score serving feeds the monitor
+    val_scores = y_val_prob if y_val_prob is not None else y_val_pred
+    model_dir = package_model(best_model, args.input_data, args.output_path, val_scores)
+    mlflow.log_artifacts(model_dir, artifact_path="model")
 
     print("Model training complete and all metrics logged to MLflow.")
 
@@ -115,5 +268,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input_data", type=str, required=True)
     parser.add_argument("--output_path", type=str, required=True)
+    parser.add_argument("--neg_sample_rate", type=float, default=1.0,
+                        help="Share of non-defaulters kept during hyperparameter search (1 = no downsampling)")
+    parser.add_argument("--compare_full_search", type=lambda v: str(v).lower() == "true", default=False,
+                        help="Also run the full-data search and report speedup and validation metric deltas")
+    parser.add_argument("--stack", type=lambda v: str(v).lower() == "true", default=False,
+                        help="Stack all tuned families with a meta-model on their out-of-fold predictions; "
+                             "used if its CV F1 beats the best single model")
     args = parser.parse_args()
     main(args)
\ No newline at end of file
@@ -1,54 +1,62 @@
 import os
 import sys
 import argparse
-import re
 import logging
 from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from azure.identity import DefaultAzureCredential
-from azure.ai.ml import MLClient, Input
+from azure.ai.ml import MLClient, Input, Output
 from azure.ai.ml.constants import AssetTypes
 from azure.ai.ml.dsl import pipeline
 
 from utils.azure_client import get_ml_client
+from utils.registry import get_resolver, version_key
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_latest_component(ml_client, name):
-    versions = ml_client.components.list(name=name)
-    latest = max(versions, key=lambda x: int(x.version))
-    logger.info(f"Using latest version of component '{name}': v{latest.version}")
-    return latest
-
-def get_latest_environment(ml_client, name):
-    envs = ml_client.environments.list(name=name)
-    latest = max(envs, key=lambda x: int(x.version))
-    logger.info(f"Using latest version of environment '{name}': v{latest.version}")
-    return latest
-
-def get_latest_data_asset(ml_client, name):
-    assets = list(ml_client.data.list(name=name))
-    if not assets:
-        raise ValueError(f"No data assets found with name '{name}'")
-    def extract_version_number(asset):
-        match = re.search(r'\d+', asset.version)
-        return int(match.group()) if match else 0
-    latest = max(assets, key=extract_version_number)
-    logger.info(f"Using latest version of data asset '{name}': {latest.version}")
-    return latest
-
-def define_pipeline(preprocess_component, train_component, evaluate_component):
+MODEL_NAME = "credit-default-model"
+CHAMPION_CACHE_URI = "azureml://datastores/workspaceblobstore/paths/evaluate_cache/"
+
+def resolve_champion(resolver, name=MODEL_NAME):
+    """Highest registered version that was not force-registered past a failed gate, or None.
+
+    Listed directly rather than through the resolver cache so a version registered
+    moments ago is not missed.
+    """
+    assets = [a for a in resolver.backend.list_assets("models", name)
+              if (getattr(a, "tags", None) or {}).get("registration_gate") != "forced"]
+    return max(assets, key=lambda a: version_key(a.version)) if assets else None
+
+def define_pipeline(preprocess_component, train_component, evaluate_component, metrics_only=False,
+                    partitioned_input=False, neg_sample_rate=1.0, stack=False, champion=None):
     @pipeline(default_compute="cpu-cluster")
     def credit_default_pipeline(input_data):
-        preprocess_job = preprocess_component(input_data=input_data)
-        train_job = train_component(input_data=preprocess_job.outputs.output_path)
+        if partitioned_input:
+            preprocess_job = preprocess_component(input_partitions=input_data)
+        else:
+            preprocess_job = preprocess_component(input_data=input_data)
+        train_job = train_component(
+            input_data=preprocess_job.outputs.output_path,
+            neg_sample_rate=neg_sample_rate,
+            stack=stack
+        )
+        champion_inputs = {}
+        if champion is not None:
+            champion_inputs = {
+                "champion_model": Input(type=AssetTypes.MLFLOW_MODEL, path=f"azureml:{champion.name}:{champion.version}"),
+                "champion_version": str(champion.version),
+            }
         evaluate_job = evaluate_component(
             input_data=preprocess_job.outputs.output_path,
-            model_path=train_job.outputs.output_path
+            model_path=train_job.outputs.output_path,
+            metrics_only=metrics_only,
+            **champion_inputs
         )
+        # shared across runs; inputs cannot be mounted writable, so the cache is bound as an output
+        evaluate_job.outputs.cache_dir = Output(type=AssetTypes.URI_FOLDER, path=CHAMPION_CACHE_URI, mode="rw_mount")
         return {"eval_output": evaluate_job.outputs.output_path}
     return credit_default_pipeline
 
@@ -56,27 +64,54 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--env", type=str, default="dev", choices=["dev", "test", "prod"],
                         help="Target environment to run the pipeline in (default: dev)")
+    parser.add_argument("--metrics_only", action="store_true",
+                        help="Skip evaluation plots for faster CI runs")
+    parser.add_argument("--neg_sample_rate", type=float, default=1.0,
+                        help="Share of non-defaulters used during hyperparameter search (winner is refit on all data)")
+    parser.add_argument("--stack", action="store_true",
+                        help="Try a stacked ensemble of all tuned model families built from their out-of-fold predictions")
     args = parser.parse_args()
 
     ml_client = get_ml_client(args.env)
     logger.info(f"🔧 Targeting workspace: {ml_client.workspace_name}")
 
     try:
-        preprocess_component = get_latest_component(ml_client, "preprocess_v2")
-        train_component = get_latest_component(ml_client, "train_model_v1")
-        evaluate_component = get_latest_component(ml_client, "evaluate_model_v1")
+        resolver = get_resolver(args.env)
+        latest = resolver.latest_many([
+            ("components", "preprocess_v2"),
+            ("components", "train_model_v1"),
+            ("components", "evaluate_model_v1"),
+            ("environments", "mle-env"),
+            ("data", "credit_default_data"),
+        ], fresh=True)
+        for (kind, name), asset in latest.items():
+            logger.info(f"Using latest version of {kind} '{name}': {asset.version}")
+
+        preprocess_component = latest[("components", "preprocess_v2")]
+        train_component = latest[("components", "train_model_v1")]
+        evaluate_component = latest[("components", "evaluate_model_v1")]
 
-        latest_env = get_latest_environment(ml_client, "mle-env")
+        latest_env = latest[("environments", "mle-env")]
         for comp in [preprocess_component, train_component, evaluate_component]:
             comp.environment = latest_env.id
 
-        latest_data = get_latest_data_asset(ml_client, "credit_default_data")
+        latest_data = latest[("data", "credit_default_data")]
         data_input_uri = Input(
-            type=AssetTypes.URI_FILE,
+            type=latest_data.type or AssetTypes.URI_FILE,
             path=f"azureml:{latest_data.name}:{latest_data.version}"
         )
 
-        credit_pipeline = define_pipeline(preprocess_component, train_component, evaluate_component)
+        champion = resolve_champion(resolver)
+        if champion is not None:
+            logger.info(f"Champion for evaluation: {champion.name}:{champion.version}")
+        else:
+            logger.info("No registered model yet: the first trained model is registered without comparison.")
+
+        credit_pipeline = define_pipeline(
+            preprocess_component, train_component, evaluate_component, metrics_only=args.metrics_only,
+            partitioned_input=data_input_uri.type == AssetTypes.URI_FOLDER,
+            neg_sample_rate=args.neg_sample_rate, stack=args.stack, champion=champion
+        )
         pipeline_job = credit_pipeline(input_data=data_input_uri)
         timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
         pipeline_job.name = f"credit-default-pipeline-{timestamp}"
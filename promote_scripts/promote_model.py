@@ -1,52 +1,192 @@
 import os
+import re
 import sys
-from azure.ai.ml import MLClient
-from azure.ai.ml.entities import Model
+import json
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.azure_client import get_ml_client  
+from utils.registry import get_resolver
+from utils.datastore import BlobDatastore, LocalFolderStore, hashing_stream
 
+DEFAULT_ASSETS = ["models:credit-default-model"]
+DOWNLOAD_ROOT = "promoted_model_downloads"
 
-def get_highest_model_version(ml_client, model_name: str) -> str:
-    """Returns the highest version number of a registered model."""
-    models = ml_client.models.list(name=model_name)
-    versions = [int(m.version) for m in models if m.version.isdigit()]
-    if not versions:
-        raise ValueError(f"No registered versions found for model: {model_name}")
-    return str(max(versions))
 
+def asset_location(backend, path):
+    """(store, prefix) holding an asset's files: a workspace datastore, or a local path for LocalRegistry."""
+    match = re.search(r"datastores/([^/]+)/paths/(.+?)/?$", str(path))
+    if match and hasattr(backend, "ml_client"):
+        return BlobDatastore(backend.ml_client, datastore_name=match.group(1)), match.group(2)
+    if match or "://" in str(path):
+        raise ValueError(f"Cannot stream asset files from '{path}'")
+    path = os.path.abspath(path)
+    return LocalFolderStore(os.path.dirname(path)), os.path.basename(path)
 
-def main():
-    model_name = "credit-default-model"
 
-    test_ml = get_ml_client("test")
-    prod_ml = get_ml_client("prod")
+def download_model(ml_client, source, download_root=DOWNLOAD_ROOT):
+    """Fallback for model files that cannot be streamed, e.g. azureml://jobs/<run>/outputs/... paths."""
+    download_dir = os.path.join(download_root, f"{source.name}_v{source.version}")
+    os.makedirs(download_dir, exist_ok=True)
+    ml_client.models.download(name=source.name, version=source.version, download_path=download_dir)
+    local_path = os.path.join(download_dir, source.name)
+    print(f"Downloaded model to: {local_path}")
+    return local_path
 
-    version = get_highest_model_version(test_ml, model_name)
-    print(f"Fetching model '{model_name}' v{version} from TEST: {test_ml.workspace_name}")
 
-    model = test_ml.models.get(name=model_name, version=version)
-    download_dir = os.path.join("promoted_model_downloads", f"{model_name}_v{version}")
-    os.makedirs(download_dir, exist_ok=True)
+def promotion_store(backend):
+    if hasattr(backend, "ml_client"):
+        return BlobDatastore(backend.ml_client)
+    return LocalFolderStore(os.path.join(backend.root, "files"))
+
+
+def _stream_md5(store, remote_path):
+    hasher = hashlib.md5()
+    for _ in hashing_stream(store.open_stream(remote_path), hasher):
+        pass
+    return hasher.hexdigest()
+
+
+def build_manifest(store, prefix, max_workers=8):
+    """{path relative to prefix: (size, md5)}; files without a stored md5 are hashed by streaming."""
+    files = store.list_files(prefix)
+
+    def complete(entry):
+        remote_path, size, md5 = entry
+        return remote_path[len(prefix):].lstrip("/"), (size, md5 or _stream_md5(store, remote_path))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(pool.map(complete, files))
+
+
+def manifest_hash(manifest):
+    lines = "\n".join(f"{rel}:{size}:{md5}" for rel, (size, md5) in sorted(manifest.items()))
+    return hashlib.md5(lines.encode()).hexdigest()
+
+
+def environment_hash(env):
+    spec = {"image": getattr(env, "image", None), "conda_file": getattr(env, "conda_file", None)}
+    return hashlib.md5(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def copy_files(source, source_prefix, manifest, target, target_prefix, max_workers=8):
+    """Streams every file straight from source to target in parallel, checking md5s in transit."""
+
+    def copy_one(rel):
+        size, md5 = manifest[rel]
+        src = f"{source_prefix}/{rel}" if rel else source_prefix
+        dst = f"{target_prefix}/{rel}" if rel else target_prefix
+        if target.exists(dst, md5):
+            return False
+        written = target.write_stream(dst, source.open_stream(src))
+        if written != md5:
+            raise IOError(f"Checksum mismatch copying {src}: expected {md5}, wrote {written}")
+        return True
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        copied = sum(pool.map(copy_one, manifest))
+    return copied
+
+
+def verify_copy(target, target_prefix, manifest):
+    copied = build_manifest(target, target_prefix)
+    problems = [rel for rel, entry in manifest.items() if copied.get(rel) != entry]
+    if problems:
+        raise IOError(f"Promotion verification failed for {len(problems)} file(s): {problems[:5]}")
+
+
+def _build_asset(kind, source, path, content_hash, source_env):
+    tags = {**(getattr(source, "tags", None) or {}), "hash": content_hash,
+            "stage": "production", "source": source_env}
+    description = f"Promoted from {source_env} environment"
+    if kind == "models":
+        from azure.ai.ml.entities import Model
+        return Model(name=source.name, version=source.version, path=path, type=getattr(source, "type", None),
+                     description=description, tags=tags)
+    if kind == "data":
+        from azure.ai.ml.entities import Data
+        return Data(name=source.name, version=source.version, path=path, type=getattr(source, "type", None),
+                    description=description, tags=tags)
+    from azure.ai.ml.entities import Environment
+    return Environment(name=source.name, version=source.version, image=source.image,
+                       conda_file=getattr(source, "conda_file", None), description=description, tags=tags)
+
+
+def promote_asset(kind, name, source_resolver, target_resolver, version=None, source_env="test", max_workers=8):
+    """Copies one registered asset between workspaces, addressed by content.
+
+    If the target already holds an asset of the same name with the same content
+    hash nothing is transferred. Otherwise the files are streamed store-to-store
+    (no local staging copy), checked against their md5s and registered. Models
+    stored where they cannot be streamed from are downloaded and re-uploaded.
+    """
+    source_backend, target_backend = source_resolver.backend, target_resolver.backend
+    version = version or source_resolver.latest_version(kind, name, fresh=True)
+    source = source_backend.get(kind, name, version)
+    print(f"Promoting {kind} {name}:{version}: {source_backend.workspace} -> {target_backend.workspace}")
+
+    manifest = local_path = None
+    if kind == "environments":
+        content_hash = (source.tags or {}).get("hash") or environment_hash(source)
+    else:
+        try:
+            store, prefix = asset_location(source_backend, source.path)
+        except ValueError:
+            if kind != "models" or not hasattr(source_backend, "ml_client"):
+                raise
+            print(f"Cannot stream files from {source.path}; downloading the model instead.")
+            local_path = download_model(source_backend.ml_client, source)
+            store, prefix = LocalFolderStore(os.path.dirname(local_path)), os.path.basename(local_path)
+        manifest = build_manifest(store, prefix, max_workers)
+        if not manifest:
+            raise FileNotFoundError(f"No files found for {kind} {name}:{version} at {source.path}")
+        # data assets keep the hash data_upload.py registered them under, so PROD dedupes the same way
+        content_hash = (source.tags or {}).get("hash") if kind == "data" else None
+        content_hash = content_hash or manifest_hash(manifest)
+
+    existing = target_resolver.find_by_hash(kind, name, content_hash)
+    if existing is not None:
+        print(f"Identical content already in {target_backend.workspace} as {name}:{existing.version} — skipping.")
+        return existing
+
+    path = None
+    if local_path is not None:
+        # registering a local path uploads it to the target workspace
+        path = local_path
+    elif manifest is not None:
+        target = promotion_store(target_backend)
+        single_file = list(manifest) == [""]
+        target_prefix = f"promoted/{kind}/{name}/{content_hash}"
+        if single_file:
+            target_prefix += "/" + os.path.basename(prefix)
+        copied = copy_files(store, prefix, manifest, target, target_prefix, max_workers)
+        verify_copy(target, target_prefix, manifest)
+        total_mb = sum(size for size, _ in manifest.values()) / 2**20
+        print(f"Streamed {copied}/{len(manifest)} files ({total_mb:.1f} MB total), verified against source md5s.")
+        path = target.uri(target_prefix, folder=not single_file)
 
-    test_ml.models.download(name=model.name, version=model.version, download_path=download_dir)
-    local_model_path = os.path.join(download_dir, model_name)
-    print(f"Downloaded model to: {local_model_path}")
+    promoted = target_backend.create_or_update(kind, _build_asset(kind, source, path, content_hash, source_env))
+    target_resolver.record(kind, name, version, content_hash)
+    print(f"Promotion complete: {kind} {name}:{version} -> {target_backend.workspace}")
+    return promoted
 
-    print(f"Registering in PROD: {prod_ml.workspace_name}")
-    promoted_model = Model(
-        path=local_model_path,
-        name=model_name,
-        version=version,
-        description="Promoted from test environment",
-        tags={
-            "stage": "production",
-            "source": "test"
-        }
-    )
-    prod_ml.models.create_or_update(promoted_model)
 
-    print(f"Promotion complete: {model_name} v{version} → PROD")
+def main(args):
+    source_resolver = get_resolver(args.source)
+    target_resolver = get_resolver(args.target)
+    for spec in args.assets:
+        kind, _, name = spec.partition(":")
+        if kind not in ("models", "environments", "data") or not name:
+            raise ValueError(f"Asset must be <models|environments|data>:<name>, got '{spec}'")
+        promote_asset(kind, name, source_resolver, target_resolver, source_env=args.source,
+                      max_workers=args.max_workers)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", nargs="+", default=DEFAULT_ASSETS,
+                        help="Assets to promote as <kind>:<name>, latest version of each")
+    parser.add_argument("--source", type=str, default="test", choices=["dev", "test", "prod"])
+    parser.add_argument("--target", type=str, default="prod", choices=["dev", "test", "prod"])
+    parser.add_argument("--max_workers", type=int, default=8, help="Parallel file streams")
+    main(parser.parse_args())
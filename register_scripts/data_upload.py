@@ -4,10 +4,16 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import argparse
 import urllib.request
 import hashlib
+import shutil
 from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from azure.ai.ml.entities import Data
 from azure.ai.ml.constants import AssetTypes
 from utils.azure_client import get_ml_client  
+from utils.registry import get_resolver
+from utils.datastore import calculate_file_hash, upload_folder, BlobDatastore, LocalFolderStore
 
 
 def download_google_sheet_as_excel(local_path: str, sheet_id: str):
@@ -21,39 +27,94 @@ def download_google_sheet_as_excel(local_path: str, sheet_id: str):
         print(f"Dataset already exists locally: {local_path}")
 
 
-def calculate_file_hash(file_path: str) -> str:
-    hasher = hashlib.md5()
-    with open(file_path, "rb") as f:
-        while chunk := f.read(8192):
-            hasher.update(chunk)
-    return hasher.hexdigest()
-
-
-def upload_data(ml_client, local_path):
+def read_source(local_path: str, batch_rows: int):
+    """Yields the source as DataFrames of up to batch_rows rows, so CSV and Parquet never load whole."""
+    if local_path.endswith((".xls", ".xlsx")):
+        # Excel cannot be read incrementally
+        yield pd.read_excel(local_path, header=1)
+    elif local_path.endswith(".parquet"):
+        for batch in pq.ParquetFile(local_path).iter_batches(batch_size=batch_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(local_path, chunksize=batch_rows)
+
+
+def write_partitions(local_path: str, source_hash: str, partition_rows: int) -> str:
+    partition_dir = os.path.join(os.path.dirname(local_path), "partitions", f"{source_hash}-{partition_rows}")
+    if os.path.isdir(partition_dir) and any(f.endswith(".parquet") for f in os.listdir(partition_dir)):
+        print(f"Reusing existing partitions: {partition_dir}")
+        return partition_dir
+
+    tmp_dir = partition_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    schema, writer, n_parts, part_rows = None, None, 0, 0
+    try:
+        for chunk in read_source(local_path, min(partition_rows, 100_000)):
+            # the first chunk fixes the schema, so dtypes inferred per CSV chunk cannot drift between partitions
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            schema = table.schema
+            while table.num_rows:
+                if writer is None:
+                    writer = pq.ParquetWriter(os.path.join(tmp_dir, f"part-{n_parts:05d}.parquet"), schema)
+                    n_parts, part_rows = n_parts + 1, 0
+                take = min(partition_rows - part_rows, table.num_rows)
+                writer.write_table(table.slice(0, take))
+                table, part_rows = table.slice(take), part_rows + take
+                if part_rows == partition_rows:
+                    writer.close()
+                    writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+    shutil.rmtree(partition_dir, ignore_errors=True)
+    os.replace(tmp_dir, partition_dir)
+    print(f"Wrote {n_parts} Parquet partitions of up to {partition_rows} rows to {partition_dir}")
+    return partition_dir
+
+
+def upload_data(ml_client, local_path, resolver, partition_rows=None, store=None, max_workers=8):
     base_name = "credit_default_data"
-    file_hash = calculate_file_hash(local_path)
+    source_hash = calculate_file_hash(local_path)
+    file_hash = source_hash
 
     print(f"Calculated MD5 hash: {file_hash}")
 
-    existing_assets = list(ml_client.data.list(name=base_name))
-    for asset in existing_assets:
-        if asset.tags and asset.tags.get("hash") == file_hash:
-            print(f"Identical dataset already registered: {asset.name}:{asset.version} — skipping upload.")
-            return
+    if partition_rows:
+        # partitioned uploads are content-addressed by the source hash plus the partition size
+        file_hash = hashlib.md5(f"{source_hash}:{partition_rows}".encode()).hexdigest()
+
+    asset = resolver.find_by_hash("data", base_name, file_hash)
+    if asset is not None:
+        print(f"Identical dataset already registered: {asset.name}:{asset.version} — skipping upload.")
+        return
 
     timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
     version = f"v{timestamp}"
 
+    if partition_rows:
+        partition_dir = write_partitions(local_path, source_hash, partition_rows)
+        store = store or BlobDatastore(ml_client)
+        path, uploaded, total = upload_folder(
+            store, partition_dir, f"{base_name}/{file_hash}", max_workers=max_workers
+        )
+        print(f"Uploaded {uploaded}/{total} partitions ({total - uploaded} already present)")
+        asset_type = AssetTypes.URI_FOLDER
+    else:
+        path = local_path
+        asset_type = AssetTypes.URI_FILE
+
     data_asset = Data(
         name=base_name,
         version=version,
         description="Credit card default dataset uploaded for pipeline input",
-        path=local_path,
-        type=AssetTypes.URI_FILE,
-        tags={"hash": file_hash},
+        path=path,
+        type=asset_type,
+        tags={"hash": file_hash, "partition_rows": str(partition_rows or 0)},
     )
 
-    ml_client.data.create_or_update(data_asset)
+    resolver.backend.create_or_update("data", data_asset)
+    resolver.record("data", base_name, version, file_hash)
     print(f"Registered new data asset: {base_name}:{version}")
 
 
@@ -63,6 +124,12 @@ if __name__ == "__main__":
                         help="Target environment to upload data to (default: dev)")
     parser.add_argument("--use_drive", action="store_true",
                         help="Download from Google Sheets if the file is missing")
+    parser.add_argument("--partition_rows", type=int, default=None,
+                        help="Split the file into Parquet partitions of this many rows and register a URI_FOLDER")
+    parser.add_argument("--max_workers", type=int, default=8,
+                        help="Parallel partition uploads")
+    parser.add_argument("--local_store", type=str, default=None,
+                        help="Upload partitions to this local directory instead of the workspace datastore")
     args = parser.parse_args()
 
     local_path = "data/default_of_credit_card_clients.xls"
@@ -73,5 +140,7 @@ if __name__ == "__main__":
 
     ml_client = get_ml_client(args.env)
     print(f"Connected to workspace: {ml_client.workspace_name}")
-    upload_data(ml_client, local_path)
+    store = LocalFolderStore(args.local_store) if args.local_store else None
+    upload_data(ml_client, local_path, get_resolver(args.env), partition_rows=args.partition_rows,
+                store=store, max_workers=args.max_workers)
 
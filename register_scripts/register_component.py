@@ -4,8 +4,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import argparse
 from azure.ai.ml import MLClient, load_component
 from utils.azure_client import get_ml_client  
+from utils.registry import get_resolver
 
-def register_components(ml_client):
+def register_components(ml_client, resolver):
     component_paths = []
     for root, _, files in os.walk("component_code"):
         for file in files:
@@ -17,6 +18,7 @@ def register_components(ml_client):
             print(f"\nRegistering component from: {path}")
             component = load_component(source=path)
             registered_component = ml_client.components.create_or_update(component)
+            resolver.record("components", registered_component.name, registered_component.version)
             print(f"Registered: {registered_component.name} (v{registered_component.version})")
         except Exception as e:
             print(f"Failed to register {path}: {str(e)}")
@@ -29,6 +31,6 @@ if __name__ == "__main__":
 
     ml_client = get_ml_client(args.env)
     print(f"Targeting workspace: {ml_client.workspace_name}")
-    register_components(ml_client)
+    register_components(ml_client, get_resolver(args.env))
 
 
@@ -4,8 +4,9 @@ import argparse
 from azure.ai.ml.entities import Environment
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.azure_client import get_ml_client
+from utils.registry import get_resolver
 
-def register_environment(ml_client):
+def register_environment(ml_client, resolver):
     env_name = "mle-env"
     conda_file_path = "config/environment.yaml"
 
@@ -16,7 +17,8 @@ def register_environment(ml_client):
         image="mcr.microsoft.com/azureml/openmpi4.1.0-ubuntu20.04"
     )
 
-    ml_client.environments.create_or_update(custom_env)
+    registered_env = ml_client.environments.create_or_update(custom_env)
+    resolver.record("environments", registered_env.name, registered_env.version)
     print(f"Registered environment: {custom_env.name} in workspace: {ml_client.workspace_name}")
 
 if __name__ == "__main__":
@@ -27,4 +29,4 @@ if __name__ == "__main__":
 
     ml_client = get_ml_client(args.env)
     print(f"Targeting workspace: {ml_client.workspace_name}")
-    register_environment(ml_client)
+    register_environment(ml_client, get_resolver(args.env))
@@ -0,0 +1,172 @@
+import os
+import json
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import score
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.getenv("SCORING_MAX_WORKERS", str(os.cpu_count() or 1)))
+MAX_IN_FLIGHT = int(os.getenv("SCORING_MAX_IN_FLIGHT", str(4 * MAX_WORKERS)))
+REQUEST_TIMEOUT_S = float(os.getenv("SCORING_TIMEOUT_S", "5"))
+USE_PROCESSES = os.getenv("SCORING_USE_PROCESSES", "false").lower() == "true"
+MAX_BODY_BYTES = int(os.getenv("SCORING_MAX_BODY_BYTES", str(16 * 1024 * 1024)))
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+           503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class AsyncScorer:
+    """Runs score.run() on a sized pool behind a bounded in-flight budget.
+
+    A request that arrives while `max_in_flight` predictions are still running is
+    rejected straight away with 503 instead of queueing, and a request that takes
+    longer than `timeout_s` gets a 504. Its slot is only released once the worker
+    actually finishes, so timed-out work still counts against the budget.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_in_flight=MAX_IN_FLIGHT,
+                 timeout_s=REQUEST_TIMEOUT_S, use_processes=USE_PROCESSES):
+        self.max_in_flight = max_in_flight
+        self.timeout_s = timeout_s
+        self.in_flight = 0
+        self.stats = {"accepted": 0, "shed": 0, "timed_out": 0}
+        if use_processes:
+            # each worker process loads its own model through score.init()
+            self.pool = ProcessPoolExecutor(max_workers=max_workers, initializer=score.init)
+        else:
+            score.init()
+            self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="score")
+
+    def _release(self, _):
+        self.in_flight -= 1
+
+    async def score(self, body: str):
+        if self.in_flight >= self.max_in_flight:
+            self.stats["shed"] += 1
+            return 503, {"error": f"Server busy: {self.in_flight} requests in flight, retry later."}
+
+        self.in_flight += 1
+        self.stats["accepted"] += 1
+        loop = asyncio.get_running_loop()
+        # the raw body goes to the worker, so JSON parsing happens off the event loop too
+        future = loop.run_in_executor(self.pool, score.run, body)
+        future.add_done_callback(self._release)
+        try:
+            return 200, await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout_s)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            return 504, {"error": f"Scoring exceeded {self.timeout_s:.1f}s timeout."}
+
+    def get_stats(self):
+        return {**self.stats, "in_flight": self.in_flight, "max_in_flight": self.max_in_flight,
+                "memory": score.get_memory_stats()}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    return method, path.split("?", 1)[0], headers
+
+
+async def _write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode() + body)
+    await writer.drain()
+
+
+def make_handler(scorer):
+    async def handle(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers = request
+                    length = int(headers.get("content-length", 0) or 0)
+                    if length < 0:
+                        raise ValueError("negative Content-Length")
+                except ValueError:
+                    await _write_response(writer, 400, {"error": "Malformed request line or Content-Length."}, False)
+                    break
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                if length > MAX_BODY_BYTES:
+                    await _write_response(writer, 413, {"error": f"Body exceeds {MAX_BODY_BYTES} bytes."}, False)
+                    break
+                try:
+                    body = (await reader.readexactly(length)).decode() if length else ""
+                except UnicodeDecodeError:
+                    await _write_response(writer, 400, {"error": "Request body is not valid UTF-8."}, keep_alive)
+                    if not keep_alive:
+                        break
+                    continue
+
+                if method == "GET" and path == "/":
+                    status, payload = 200, {"status": "Healthy"}
+                elif method == "GET" and path == "/stats":
+                    status, payload = 200, scorer.get_stats()
+                elif method == "POST" and path == "/score":
+                    status, payload = await scorer.score(body)
+                else:
+                    status, payload = 404, {"error": f"No route for {method} {path}"}
+
+                await _write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(host, port, scorer):
+    server = await asyncio.start_server(make_handler(scorer), host, port)
+    logger.info(f"Async scoring server listening on http://{host}:{port}/score "
+                f"(workers={MAX_WORKERS}, max_in_flight={scorer.max_in_flight}, timeout={scorer.timeout_s}s)")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local asyncio scoring server around score.init()/run()")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--model_dir", type=str, default=None,
+                        help="Folder containing an MLmodel (sets AZUREML_MODEL_DIR)")
+    args = parser.parse_args()
+
+    if args.model_dir:
+        os.environ["AZUREML_MODEL_DIR"] = args.model_dir
+
+    scorer = AsyncScorer()
+    try:
+        asyncio.run(serve(args.host, args.port, scorer))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scorer.shutdown()
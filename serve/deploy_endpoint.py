@@ -5,12 +5,37 @@ from azure.core.exceptions import ResourceNotFoundError
 from azure.ai.ml.entities import (
     ManagedOnlineEndpoint,
     ManagedOnlineDeployment,
-    CodeConfiguration
+    CodeConfiguration,
+    OnlineRequestSettings
 )
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.azure_client import get_ml_client
+from utils.registry import get_resolver
+from rollout import AzureEndpointClient, load_rollout_config, build_replay_requests, live_slot, run_rollout
 
-def deploy_endpoint(ml_client, env_name):
+ROLLOUT_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "rollout.yaml")
+
+def build_deployment(name, endpoint_name, model, environment):
+    return ManagedOnlineDeployment(
+        name=name,
+        endpoint_name=endpoint_name,
+        model=model,
+        environment=environment,
+        code_configuration=CodeConfiguration(
+            code="./serve",
+            scoring_script="score.py"
+        ),
+        instance_type="Standard_E2s_v3",
+        instance_count=2,
+        # same admission control as serve/async_server.py: excess requests get a 429, slow ones a timeout
+        request_settings=OnlineRequestSettings(
+            max_concurrent_requests_per_instance=4,
+            max_queue_wait_ms=500,
+            request_timeout_ms=5000
+        )
+    )
+
+def deploy_endpoint(ml_client, env_name, resolver, config_path=ROLLOUT_CONFIG, keep_candidate=False):
     endpoint_name = f"credit-default-endpoint-{env_name}"
     print(f"Starting deployment to {env_name.upper()} workspace: {ml_client.workspace_name}")
 
@@ -33,36 +58,49 @@ def deploy_endpoint(ml_client, env_name):
         ml_client.begin_create_or_update(endpoint).result()
         print("Endpoint created")
 
-    latest_model = max(
-        ml_client.models.list(name="credit-default-model"),
-        key=lambda m: int(m.version)
-    )
-    latest_env = max(
-        ml_client.environments.list(name="mle-env"),
-        key=lambda e: int(e.version)
-    )
+    # always listed: a version CI registered moments ago must not be missed
+    latest = resolver.latest_many([("models", "credit-default-model"), ("environments", "mle-env")], fresh=True)
+    latest_model = latest[("models", "credit-default-model")]
+    latest_env = latest[("environments", "mle-env")]
 
-    deployment = ManagedOnlineDeployment(
-        name="blue",
-        endpoint_name=endpoint_name,
-        model=latest_model,
-        environment=latest_env,
-        code_configuration=CodeConfiguration(
-            code="./serve",
-            scoring_script="score.py"
-        ),
-        instance_type="Standard_E2s_v3",
-        instance_count=2
-    )
-    ml_client.begin_create_or_update(deployment).result()
-    print(f"Deployment completed with model v: {latest_model.version}")
+    client = AzureEndpointClient(ml_client, endpoint_name)
+    incumbent = live_slot(client.get_traffic())
+    if incumbent is None:
+        # first deployment: nothing to compare against
+        ml_client.begin_create_or_update(build_deployment("blue", endpoint_name, latest_model, latest_env)).result()
+        client.set_traffic({"blue": 100})
+        print(f"Deployment completed with model v: {latest_model.version} (blue, 100% traffic)")
+        return {"status": "promoted", "stage": "initial", "breaches": [], "history": []}
+
+    candidate = "green" if incumbent == "blue" else "blue"
+    print(f"{incumbent} is live; deploying model v: {latest_model.version} to {candidate} with no traffic.")
+    ml_client.begin_create_or_update(build_deployment(candidate, endpoint_name, latest_model, latest_env)).result()
+
+    config = load_rollout_config(config_path)
+    if keep_candidate:
+        config["keep_candidate_on_rollback"] = True
+    replay = config.get("replay", {})
+    requests = build_replay_requests(replay.get("file"), replay.get("synthetic_requests", 200),
+                                     replay.get("max_batch_rows", 10))
+    result = run_rollout(client, candidate, incumbent, requests, config)
+    if result["status"] == "promoted":
+        print(f"Deployment completed with model v: {latest_model.version} ({candidate}); "
+              f"{incumbent} kept at 0% traffic for instant rollback.")
+    return result
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--env", type=str, choices=["dev", "test", "prod"], default="dev",
                         help="Target environment to deploy to")
+    parser.add_argument("--rollout_config", type=str, default=ROLLOUT_CONFIG,
+                        help="Traffic steps, replay and latency/error SLOs for the blue/green rollout")
+    parser.add_argument("--keep_candidate", action="store_true",
+                        help="Leave a rolled-back candidate deployment provisioned for debugging")
     args = parser.parse_args()
 
     ml_client = get_ml_client(args.env)
-    deploy_endpoint(ml_client, args.env)
+    result = deploy_endpoint(ml_client, args.env, get_resolver(args.env), args.rollout_config,
+                             keep_candidate=args.keep_candidate)
+    if result["status"] != "promoted":
+        sys.exit(1)
@@ -0,0 +1,108 @@
+import json
+import time
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PSI_EPSILON = 1e-4
+PSI_ALERT = 0.25
+
+
+def psi(expected, actual):
+    expected = np.clip(np.asarray(expected, dtype=np.float64), PSI_EPSILON, None)
+    actual = np.clip(np.asarray(actual, dtype=np.float64), PSI_EPSILON, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def binned_ks(expected, actual):
+    return float(np.max(np.abs(np.cumsum(expected) - np.cumsum(actual))))
+
+
+class DriftMonitor:
+    """Streaming histograms of incoming features and predictions on the training bin edges.
+
+    Memory is one counter array per feature (bins + 1 for missing), independent of
+    traffic. Every `check_every_rows` rows or `check_every_s` seconds the counts are
+    compared with the reference proportions (PSI and binned KS) and logged.
+    """
+
+    def __init__(self, reference, check_every_rows=10000, check_every_s=300):
+        self.check_every_rows = check_every_rows
+        self.check_every_s = check_every_s
+        self._lock = threading.Lock()
+        self.edges = {}
+        self.expected = {}
+        for name, profile in reference.get("features", {}).items():
+            self.edges[name] = np.asarray(profile["edges"], dtype=np.float64)
+            self.expected[name] = np.asarray(profile["proportions"], dtype=np.float64)
+        if "prediction" in reference:
+            self.edges["__prediction__"] = np.asarray(reference["prediction"]["edges"], dtype=np.float64)
+            self.expected["__prediction__"] = np.asarray(reference["prediction"]["proportions"], dtype=np.float64)
+        self.counts = {name: np.zeros(len(e) + 2, dtype=np.int64) for name, e in self.edges.items()}
+        self.rows_seen = 0
+        self._rows_since_check = 0
+        self._last_check = time.monotonic()
+        self.last_report = None
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as f:
+            return cls(json.load(f), **kwargs)
+
+    def _bin(self, name, values):
+        values = np.asarray(values, dtype=np.float64)
+        bins = np.searchsorted(self.edges[name], values, side="right")
+        bins[np.isnan(values)] = len(self.edges[name]) + 1
+        return np.bincount(bins, minlength=len(self.edges[name]) + 2)
+
+    def update(self, input_df, predictions=None):
+        batch = {
+            name: self._bin(name, input_df[name].to_numpy())
+            for name in self.edges if name in input_df.columns
+        }
+        if predictions is not None and "__prediction__" in self.edges:
+            batch["__prediction__"] = self._bin("__prediction__", predictions)
+
+        with self._lock:
+            for name, counts in batch.items():
+                self.counts[name] += counts
+            self.rows_seen += len(input_df)
+            self._rows_since_check += len(input_df)
+            due = (self._rows_since_check >= self.check_every_rows
+                   or time.monotonic() - self._last_check >= self.check_every_s)
+            if due:
+                self._rows_since_check = 0
+                self._last_check = time.monotonic()
+        if due:
+            self.check()
+
+    def compute(self):
+        with self._lock:
+            counts = {name: c.copy() for name, c in self.counts.items()}
+        report = {}
+        for name, c in counts.items():
+            observed = c[:-1].sum()
+            if observed == 0:
+                continue
+            actual = c[:-1] / observed
+            report[name] = {
+                "psi": psi(self.expected[name], actual),
+                "ks": binned_ks(self.expected[name], actual),
+                "missing_rate": float(c[-1] / c.sum()),
+            }
+        return report
+
+    def check(self):
+        report = self.compute()
+        self.last_report = report
+        drifted = sorted((name for name, r in report.items() if r["psi"] >= PSI_ALERT),
+                         key=lambda name: -report[name]["psi"])
+        if drifted:
+            logger.warning(f"Drift detected after {self.rows_seen} rows (PSI >= {PSI_ALERT}): "
+                           + ", ".join(f"{name}={report[name]['psi']:.3f}" for name in drifted))
+        else:
+            logger.info(f"No drift after {self.rows_seen} rows; max PSI "
+                        f"{max((r['psi'] for r in report.values()), default=0.0):.3f}")
+        return report
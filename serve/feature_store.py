@@ -0,0 +1,31 @@
+import os
+import json
+import numpy as np
+
+
+class FeatureStore:
+    """Read-only, memory-mapped feature rows keyed by account ID.
+
+    `keys.npy` is sorted, so it doubles as the index: a batch of IDs is resolved
+    with one searchsorted and only the requested rows are copied out of the map.
+    """
+
+    def __init__(self, store_dir):
+        with open(os.path.join(store_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.columns = self.meta["columns"]
+        self.keys = np.load(os.path.join(store_dir, "keys.npy"), mmap_mode="r")
+        self.features = np.load(os.path.join(store_dir, "features.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, ids):
+        """Returns (rows for the IDs that were found, boolean mask of found IDs)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self.keys) == 0:
+            return self.features[:0], np.zeros(len(ids), dtype=bool)
+        pos = np.searchsorted(self.keys, ids)
+        pos_clipped = np.minimum(pos, len(self.keys) - 1)
+        found = (pos < len(self.keys)) & (self.keys[pos_clipped] == ids)
+        return self.features[pos_clipped[found]], found
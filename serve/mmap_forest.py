@@ -0,0 +1,75 @@
+import os
+import json
+import numpy as np
+
+FOREST_FORMAT = "flat-forest-v1"
+PREDICT_CHUNK_ELEMENTS = 4_000_000
+
+
+class MmapForest:
+    """Tree/forest classifier served straight from read-only memory-mapped node arrays.
+
+    The arrays written by training's export_flat_forest() are opened with
+    mmap_mode="r", so every worker process on a node shares the same page-cache
+    copy instead of unpickling its own. Prediction walks all trees one level at a
+    time; it matches sklearn's predict_proba (float32 inputs, x <= threshold goes left).
+    """
+
+    def __init__(self, forest_dir):
+        with open(os.path.join(forest_dir, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format") != FOREST_FORMAT:
+            raise ValueError(f"Unsupported forest format: {meta.get('format')}")
+        self.max_depth = meta["max_depth"]
+        self.feature_names_in_ = meta["feature_names"]
+        self.classes_ = np.asarray(meta["classes"])
+        for name in ("roots", "feature", "threshold", "left", "right", "proba"):
+            setattr(self, name, np.load(os.path.join(forest_dir, f"{name}.npy"), mmap_mode="r"))
+
+    @classmethod
+    def exists(cls, model_path):
+        return os.path.exists(os.path.join(model_path, "forest", "meta.json"))
+
+    def _matrix(self, X):
+        if hasattr(X, "columns") and self.feature_names_in_:
+            X = X[self.feature_names_in_]
+        return np.ascontiguousarray(X, dtype=np.float32)
+
+    def _walk(self, X, on_step=None):
+        """Leaf node of every (tree, row); on_step(rows, nodes, next_nodes) sees each move."""
+        nodes = np.repeat(np.asarray(self.roots)[:, None], len(X), axis=1)
+        rows = np.arange(len(X))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            next_nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            if on_step is not None:
+                on_step(rows, nodes, next_nodes)
+            nodes = next_nodes
+        return nodes
+
+    def predict_proba(self, X):
+        X = self._matrix(X)
+        positive = np.empty(len(X))
+        chunk = max(1, PREDICT_CHUNK_ELEMENTS // len(self.roots))
+        for start in range(0, len(X), chunk):
+            leaves = self._walk(X[start:start + chunk])
+            positive[start:start + chunk] = self.proba[leaves].mean(axis=0)
+        return np.column_stack([1 - positive, positive])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+    def contributions(self, X):
+        """Path contributions to P(default), as in reason_codes.TreePathExplainer."""
+        X = self._matrix(X)
+        n_features = max(len(self.feature_names_in_), X.shape[1])
+        totals = np.zeros(len(X) * n_features)
+
+        def credit(rows, nodes, next_nodes):
+            moved = next_nodes != nodes
+            index = (np.broadcast_to(rows, nodes.shape) * n_features + self.feature[nodes])[moved]
+            totals[:] += np.bincount(index, weights=(self.proba[next_nodes] - self.proba[nodes])[moved],
+                                     minlength=len(totals))
+
+        self._walk(X, credit)
+        return totals.reshape(len(X), n_features) / len(self.roots)
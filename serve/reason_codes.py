@@ -0,0 +1,130 @@
+import numpy as np
+from scipy import sparse
+
+
+def _leaf_contributions(tree, n_features, positive_class=1):
+    """Sparse (n_leaves x n_features) path contributions to P(default), plus node -> leaf row map.
+
+    Entering a child changes P(default) by value(child) - value(parent); that delta is
+    credited to the parent's split feature and summed along every root-to-leaf path.
+    """
+    n_nodes = tree.node_count
+    value = tree.value[:, 0, :]
+    proba = value[:, positive_class] / np.maximum(value.sum(axis=1), 1e-12)
+
+    parent = np.full(n_nodes, -1)
+    split_feature = np.zeros(n_nodes, dtype=np.int64)
+    for children in (tree.children_left, tree.children_right):
+        internal = np.flatnonzero(children >= 0)
+        parent[children[internal]] = internal
+        split_feature[children[internal]] = tree.feature[internal]
+    node_delta = np.where(parent >= 0, proba - proba[np.maximum(parent, 0)], 0.0)
+
+    # walk all leaves up to the root one level at a time; each step adds the
+    # delta of the node currently visited to the row of the leaf it started from
+    leaves = np.flatnonzero(tree.children_left < 0)
+    rows, cols, vals = [], [], []
+    start = np.arange(len(leaves))
+    current = leaves.copy()
+    while len(current):
+        rows.append(start)
+        cols.append(split_feature[current])
+        vals.append(node_delta[current])
+        keep = parent[current] >= 0
+        start, current = start[keep], parent[current[keep]]
+
+    leaf_row = np.full(n_nodes, -1)
+    leaf_row[leaves] = np.arange(len(leaves))
+    contributions = sparse.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(len(leaves), n_features)
+    )
+    return contributions, leaf_row
+
+
+class TreePathExplainer:
+    """Per-row path contributions for sklearn trees and forests.
+
+    The contribution vector of every leaf is precomputed once per model, so
+    explaining a batch is one apply() per tree plus a sparse gather-sum.
+    """
+
+    def __init__(self, estimator, n_features):
+        self.trees = [e.tree_ for e in estimator.estimators_] if hasattr(estimator, "estimators_") else [estimator.tree_]
+        tables, self.leaf_rows, self.offsets = [], [], []
+        offset = 0
+        for tree in self.trees:
+            contributions, leaf_row = _leaf_contributions(tree, n_features)
+            tables.append(contributions)
+            self.leaf_rows.append(leaf_row)
+            self.offsets.append(offset)
+            offset += contributions.shape[0]
+        self.table = sparse.vstack(tables).tocsr()
+
+    def __call__(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n, n_trees = X.shape[0], len(self.trees)
+        cols = np.empty((n, n_trees), dtype=np.int64)
+        for t, tree in enumerate(self.trees):
+            cols[:, t] = self.offsets[t] + self.leaf_rows[t][tree.apply(X)]
+        indicator = sparse.csr_matrix(
+            (np.full(n * n_trees, 1.0 / n_trees), cols.ravel(), np.arange(0, n * n_trees + 1, n_trees)),
+            shape=(n, self.table.shape[0])
+        )
+        return (indicator @ self.table).toarray()
+
+
+class XGBoostExplainer:
+    """Exact TreeSHAP contributions (log-odds) from the booster's native implementation."""
+
+    def __init__(self, estimator):
+        self.booster = estimator.get_booster()
+        # a booster trained on a DataFrame rejects an unnamed DMatrix
+        self.feature_names = self.booster.feature_names
+
+    def __call__(self, X):
+        import xgboost
+        dmatrix = xgboost.DMatrix(X, feature_names=list(self.feature_names) if self.feature_names else None)
+        contribs = self.booster.predict(dmatrix, pred_contribs=True)
+        return contribs[:, :-1]
+
+
+class LinearExplainer:
+    """coefficient x value; features are standardised, so this is the contribution relative to the mean."""
+
+    def __init__(self, estimator):
+        self.coef = np.asarray(estimator.coef_, dtype=np.float64)[0]
+
+    def __call__(self, X):
+        return np.asarray(X, dtype=np.float64) * self.coef
+
+
+def build_explainer(estimator, n_features):
+    if hasattr(estimator, "contributions"):
+        return estimator.contributions
+    if type(estimator).__name__.startswith("XGB"):
+        return XGBoostExplainer(estimator)
+    if hasattr(estimator, "coef_"):
+        return LinearExplainer(estimator)
+    if hasattr(estimator, "tree_") or (
+        hasattr(estimator, "estimators_") and hasattr(estimator.estimators_[0], "tree_")
+    ):
+        return TreePathExplainer(estimator, n_features)
+    return None
+
+
+def top_k_reasons(contributions, feature_names, k=3):
+    """The k features pushing each row hardest towards default (positive contributions only)."""
+    k = max(1, min(k, contributions.shape[1]))
+    top = np.argpartition(-contributions, k - 1, axis=1)[:, :k]
+    top_values = np.take_along_axis(contributions, top, axis=1)
+    order = np.argsort(-top_values, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_values = np.take_along_axis(top_values, order, axis=1)
+    return [
+        [
+            {"feature": feature_names[j], "contribution": round(float(v), 6)}
+            for j, v in zip(row_idx, row_vals) if v > 0
+        ]
+        for row_idx, row_vals in zip(top, top_values)
+    ]
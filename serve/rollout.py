@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import random
+import http.client
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import yaml
+
+SLOTS = ("blue", "green")
+SAMPLE_REQUEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_request.json")
+
+
+def load_rollout_config(config_path):
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"Rollout config not found at: {config_path}")
+    with open(config_path, "r") as f:
+        return yaml.safe_load(f)
+
+
+class AzureEndpointClient:
+    """Endpoint operations the rollout needs, on a managed online endpoint.
+
+    Requests go straight to the scoring URI with the `azureml-model-deployment`
+    header, so blue and green can be measured independently of the traffic split.
+    """
+
+    def __init__(self, ml_client, endpoint_name, timeout_s=10):
+        self.ml_client = ml_client
+        self.endpoint_name = endpoint_name
+        self.timeout_s = timeout_s
+        endpoint = ml_client.online_endpoints.get(name=endpoint_name)
+        self.scoring_uri = endpoint.scoring_uri
+        self.key = ml_client.online_endpoints.get_keys(name=endpoint_name).primary_key
+
+    def get_traffic(self):
+        return dict(self.ml_client.online_endpoints.get(name=self.endpoint_name).traffic or {})
+
+    def set_traffic(self, traffic):
+        endpoint = self.ml_client.online_endpoints.get(name=self.endpoint_name)
+        endpoint.traffic = traffic
+        self.ml_client.online_endpoints.begin_create_or_update(endpoint).result()
+
+    def delete_deployment(self, name):
+        self.ml_client.online_deployments.begin_delete(name=name, endpoint_name=self.endpoint_name).result()
+
+    def invoke(self, deployment, body):
+        request = urllib.request.Request(
+            self.scoring_uri,
+            data=body.encode(),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.key}",
+                "azureml-model-deployment": deployment,
+            },
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout_s) as response:
+                payload = json.loads(response.read().decode() or "{}")
+            # score.run() reports its own failures in the body with a 200
+            return not (isinstance(payload, dict) and "error" in payload)
+        except (OSError, http.client.HTTPException, ValueError):
+            # URLError, timeouts, resets and dropped connections all count as failed requests
+            return False
+
+
+class LocalEndpointClient:
+    """In-process stand-in for AzureEndpointClient; each deployment is a callable(body) -> response dict."""
+
+    def __init__(self, deployments, traffic=None):
+        self.deployments = dict(deployments)
+        self.traffic = dict(traffic or {})
+        self.traffic_history = []
+
+    def get_traffic(self):
+        return dict(self.traffic)
+
+    def set_traffic(self, traffic):
+        self.traffic = dict(traffic)
+        self.traffic_history.append(dict(traffic))
+
+    def delete_deployment(self, name):
+        self.deployments.pop(name, None)
+        self.traffic.pop(name, None)
+
+    def invoke(self, deployment, body):
+        try:
+            payload = self.deployments[deployment](body)
+            return not (isinstance(payload, dict) and "error" in payload)
+        except Exception:
+            return False
+
+
+def simulated_deployment(latency_ms=20.0, error_rate=0.0, seed=None):
+    """A fake deployment for LocalEndpointClient with log-normal latency and random failures."""
+    rng = random.Random(seed)
+
+    def handle(body):
+        time.sleep(rng.lognormvariate(np.log(latency_ms), 0.3) / 1000)
+        if rng.random() < error_rate:
+            raise RuntimeError("simulated failure")
+        return {"predictions": [0]}
+
+    return handle
+
+
+def build_replay_requests(replay_file=None, n_requests=200, max_batch_rows=10, seed=42):
+    """Recorded request bodies (JSONL, one per line) or synthetic ones resampled from sample_request.json."""
+    if replay_file:
+        with open(replay_file) as f:
+            return [line.strip() for line in f if line.strip()]
+
+    with open(SAMPLE_REQUEST_PATH) as f:
+        rows = json.load(f)
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(n_requests):
+        batch = []
+        for _ in range(rng.randint(1, max_batch_rows)):
+            row = dict(rng.choice(rows))
+            for key, value in row.items():
+                # vary the amounts so caches and identical inputs don't flatter the latency
+                if "amt" in key and isinstance(value, (int, float)):
+                    row[key] = round(value * rng.uniform(0.5, 1.5), 2)
+            batch.append(row)
+        requests.append(json.dumps({"data": batch}))
+    return requests
+
+
+def measure(client, deployment, requests, concurrency=4):
+    def timed(body):
+        start = time.perf_counter()
+        ok = client.invoke(deployment, body)
+        return (time.perf_counter() - start) * 1000, ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, requests))
+    latencies = np.array([r[0] for r in results])
+    errors = sum(not r[1] for r in results)
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": errors / len(results) if results else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+    }
+
+
+def check_slo(candidate, incumbent, slo):
+    """Returns the list of SLO breaches of the candidate's measurements (empty = healthy)."""
+    breaches = []
+    if candidate["error_rate"] > slo.get("max_error_rate", 0.01):
+        breaches.append(f"error rate {candidate['error_rate']:.2%} > {slo.get('max_error_rate', 0.01):.2%}")
+    if incumbent is not None:
+        increase = candidate["error_rate"] - incumbent["error_rate"]
+        if increase > slo.get("max_error_rate_increase", 0.005):
+            breaches.append(f"error rate {increase:+.2%} vs incumbent")
+    if candidate["p99_ms"] is None:
+        return breaches
+    if candidate["p99_ms"] > slo.get("max_p99_ms", 1000):
+        breaches.append(f"p99 {candidate['p99_ms']:.0f} ms > {slo.get('max_p99_ms', 1000)} ms")
+    if incumbent is not None and incumbent["p99_ms"]:
+        ratio = candidate["p99_ms"] / incumbent["p99_ms"]
+        # the slack keeps replay noise on fast endpoints from failing an equal-speed candidate
+        allowed = incumbent["p99_ms"] * slo.get("max_p99_ratio", 1.2) + slo.get("p99_slack_ms", 25)
+        if candidate["p99_ms"] > allowed:
+            breaches.append(f"p99 {ratio:.2f}x incumbent's ({candidate['p99_ms']:.0f} vs {incumbent['p99_ms']:.0f} ms)")
+    return breaches
+
+
+def live_slot(traffic):
+    """The slot currently taking most traffic, or None before the first deployment."""
+    serving = {name: pct for name, pct in traffic.items() if name in SLOTS and pct > 0}
+    return max(serving, key=serving.get) if serving else None
+
+
+def run_rollout(client, candidate, incumbent, requests, config, log=print):
+    """Replay-gates the candidate, then shifts traffic step by step while it stays within SLO.
+
+    Both deployments are measured on the same replay at every step. Any breach
+    puts all traffic back on the incumbent, stops the rollout and deletes the
+    candidate unless keep_candidate_on_rollback is set.
+    """
+    slo = config.get("slo", {})
+    concurrency = config.get("replay", {}).get("concurrency", 4)
+    history = []
+
+    def summary(stats):
+        p99 = "n/a" if stats["p99_ms"] is None else f"{stats['p99_ms']:.0f} ms"
+        return f"p99 {p99}, errors {stats['error_rate']:.2%}"
+
+    def evaluate(stage):
+        incumbent_stats = measure(client, incumbent, requests, concurrency)
+        candidate_stats = measure(client, candidate, requests, concurrency)
+        breaches = check_slo(candidate_stats, incumbent_stats, slo)
+        history.append({"stage": stage, candidate: candidate_stats, incumbent: incumbent_stats, "breaches": breaches})
+        log(f"[{stage}] {candidate}: {summary(candidate_stats)} | {incumbent}: {summary(incumbent_stats)}")
+        return breaches
+
+    def rollback(stage, breaches):
+        log(f"SLO breached at {stage}: {'; '.join(breaches)}. Rolling back to {incumbent}.")
+        client.set_traffic({incumbent: 100, candidate: 0})
+        if config.get("keep_candidate_on_rollback", False):
+            log(f"Keeping {candidate} provisioned at 0% traffic for debugging.")
+        else:
+            # a failed candidate would otherwise keep billing and holding quota
+            log(f"Deleting {candidate}.")
+            client.delete_deployment(candidate)
+        return {"status": "rolled_back", "stage": stage, "breaches": breaches, "history": history}
+
+    stage = "replay"
+    try:
+        breaches = evaluate(stage)
+        if breaches:
+            return rollback(stage, breaches)
+
+        for pct in config.get("traffic_steps", [10, 25, 50, 100]):
+            stage = f"{pct}%"
+            client.set_traffic({incumbent: 100 - pct, candidate: pct})
+            log(f"Shifted {pct}% of traffic to {candidate}.")
+            time.sleep(config.get("step_wait_s", 60))
+            breaches = evaluate(stage)
+            if breaches:
+                return rollback(stage, breaches)
+    except Exception as e:
+        # never leave a partial split behind: anything unexpected counts as a breach
+        return rollback(stage, [f"rollout aborted: {type(e).__name__}: {e}"])
+
+    log(f"Rollout complete: {candidate} is serving 100% of traffic.")
+    return {"status": "promoted", "stage": "100%", "breaches": [], "history": history}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Dry-run the rollout controller against a local mock endpoint")
+    parser.add_argument("--config", type=str, default="config/rollout.yaml")
+    parser.add_argument("--blue_latency_ms", type=float, default=20)
+    parser.add_argument("--green_latency_ms", type=float, default=20)
+    parser.add_argument("--green_error_rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = load_rollout_config(args.config)
+    config["step_wait_s"] = 0
+    client = LocalEndpointClient(
+        {"blue": simulated_deployment(args.blue_latency_ms, seed=1),
+         "green": simulated_deployment(args.green_latency_ms, args.green_error_rate, seed=2)},
+        traffic={"blue": 100, "green": 0},
+    )
+    replay = config.get("replay", {})
+    requests = build_replay_requests(replay.get("file"), replay.get("synthetic_requests", 200),
+                                     replay.get("max_batch_rows", 10))
+    result = run_rollout(client, "green", "blue", requests, config)
+    print(json.dumps({"status": result["status"], "stage": result["stage"],
+                      "traffic_history": client.traffic_history}, indent=2))
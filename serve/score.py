@@ -1,36 +1,335 @@
 import json
 import pandas as pd
+import numpy as np
 import mlflow.pyfunc
 import logging
 import os
+import re
+import time
+import random
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from drift_monitor import DriftMonitor
+from reason_codes import build_explainer, top_k_reasons
+from feature_store import FeatureStore
+from mmap_forest import MmapForest
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-model = None
+# Everything a request is scored with, published as one tuple: a hot-swap replaces the
+# model, the feature store scaled for it and its drift reference in a single rebind.
+Serving = namedtuple("Serving", ["model", "version", "feature_store", "drift_monitor"])
+serving = Serving(None, None, None, None)
+
+# Reason codes: explainers are built once per loaded model and looked up by the
+# identity of the model a request is scored with, so a hot-swap never mixes them.
+DEFAULT_TOP_K = 3
+_explainers = {}
+# (predict_proba, classes) per loaded binary classifier: one pass yields both the
+# labels returned to the caller and the P(default) the drift monitor bins
+_probability_fns = {}
+
+# Hot-swap: a background thread polls MODEL_WATCH_DIR for <version>/.../MLmodel folders
+# newer than the loaded one, loads them off the request path and rebinds `serving`.
+MODEL_WATCH_DIR = os.getenv("MODEL_WATCH_DIR")
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "60"))
+
+# Shadow scoring: a sampled fraction of requests is re-scored by SHADOW_MODEL_DIR
+# on a single background worker; the primary response never waits for it.
+SHADOW_MODEL_DIR = os.getenv("SHADOW_MODEL_DIR")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0"))
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "32"))
+SHADOW_LOG_EVERY = 100
+
+# Drift monitoring: drift_reference.json (bundled next to MLmodel by training, or
+# DRIFT_REFERENCE_PATH) enables streaming PSI/KS checks on incoming traffic.
+DRIFT_REFERENCE_PATH = os.getenv("DRIFT_REFERENCE_PATH")
+DRIFT_CHECK_EVERY_ROWS = int(os.getenv("DRIFT_CHECK_EVERY_ROWS", "10000"))
+DRIFT_CHECK_EVERY_S = float(os.getenv("DRIFT_CHECK_EVERY_S", "300"))
+
+
+# Account-ID scoring: {"ids": [...]} looks rows up in the memory-mapped feature store
+# exported by preprocess (bundled next to MLmodel by training, or FEATURE_STORE_DIR).
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR")
+
+
+# Tree models bundled by training as flat node arrays (model/forest/) are memory-mapped
+# read-only, so every worker on a node shares one physical copy of the weights.
+MODEL_MMAP = os.getenv("MODEL_MMAP", "true").lower() == "true"
+
+shadow_model = None
+_shadow_executor = None
+_shadow_slots = threading.BoundedSemaphore(SHADOW_MAX_PENDING)
+_shadow_lock = threading.Lock()
+_shadow_stats = {
+    "requests": 0,
+    "rows": 0,
+    "agreeing_rows": 0,
+    "dropped": 0,
+    "errors": 0,
+    "primary_latency_ms": deque(maxlen=1000),
+    "shadow_latency_ms": deque(maxlen=1000),
+}
+
+
+def _find_model_path(base_dir):
+    for root, dirs, files in os.walk(base_dir):
+        if "MLmodel" in files:
+            return root
+    raise FileNotFoundError(f"Could not find 'MLmodel' in any subdirectories of {base_dir}.")
+
+
+def _load_model(model_path):
+    if MODEL_MMAP and MmapForest.exists(model_path):
+        return MmapForest(os.path.join(model_path, "forest"))
+    return mlflow.pyfunc.load_model(model_path)
+
+
+def get_memory_stats():
+    """This worker's resident memory in MB; RssFile includes the shared memory-mapped weights."""
+    stats = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile", "RssShmem"):
+                    stats[f"{key}_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return stats
+
+
+def _raw_estimator(pyfunc_model, model_path):
+    if isinstance(pyfunc_model, MmapForest):
+        return pyfunc_model
+    if hasattr(pyfunc_model, "get_raw_model"):
+        try:
+            return pyfunc_model.get_raw_model()
+        except Exception:
+            pass
+    import mlflow.sklearn
+    return mlflow.sklearn.load_model(model_path)
+
+
+def _register_explainer(pyfunc_model, model_path):
+    try:
+        estimator = _raw_estimator(pyfunc_model, model_path)
+        if hasattr(estimator, "predict_proba") and len(getattr(estimator, "classes_", [])) == 2:
+            for stale in [k for k in _probability_fns if k != id(serving.model)]:
+                _probability_fns.pop(stale, None)
+            _probability_fns[id(pyfunc_model)] = (estimator.predict_proba, np.asarray(estimator.classes_))
+        feature_names = list(getattr(estimator, "feature_names_in_", []))
+        explainer = build_explainer(estimator, len(feature_names))
+        if explainer is None or not feature_names:
+            logger.info(f"Reason codes unavailable for {type(estimator).__name__}.")
+            return
+        # keep only the serving model's explainer plus the one it replaces
+        for stale in [k for k in _explainers if k != id(serving.model)]:
+            _explainers.pop(stale, None)
+        _explainers[id(pyfunc_model)] = (explainer, feature_names)
+        logger.info(f"Reason codes enabled ({type(explainer).__name__}).")
+    except Exception as e:
+        logger.error(f"Failed to build reason-code explainer: {e}")
+
+
+def explain(current_model, input_df, top_k=DEFAULT_TOP_K):
+    entry = _explainers.get(id(current_model))
+    if entry is None:
+        raise ValueError("Reason codes are not available for the deployed model.")
+    explainer, feature_names = entry
+    contributions = explainer(input_df[feature_names].to_numpy(dtype=np.float64))
+    return top_k_reasons(contributions, feature_names, top_k)
+
+
+def predict_with_probabilities(current_model, input_df):
+    """Labels and P(default) from a single predict_proba pass (probabilities are None if unavailable)."""
+    entry = _probability_fns.get(id(current_model))
+    if entry is None:
+        return np.asarray(current_model.predict(input_df)), None
+    predict_proba, classes = entry
+    probabilities = np.asarray(predict_proba(input_df))[:, 1]
+    # the same rule as the classifiers' own predict(): positive class above 0.5
+    return classes[(probabilities > 0.5).astype(int)], probabilities
+
+
+def _version_key(version):
+    match = re.search(r'\d+', str(version))
+    return int(match.group()) if match else -1
+
+
+def _latest_watched_version(watch_dir):
+    candidates = [
+        d for d in os.listdir(watch_dir)
+        if os.path.isdir(os.path.join(watch_dir, d)) and _version_key(d) >= 0
+    ]
+    return max(candidates, key=_version_key) if candidates else None
+
+
+def _load_serving(model_path, version):
+    """Loads the model plus the feature store and drift reference bundled next to its MLmodel."""
+    new_model = _load_model(model_path)
+    _register_explainer(new_model, model_path)
+    logger.info(f"Model {version} loaded ({type(new_model).__name__}); memory: {get_memory_stats()}")
+    monitor = store = None
+    try:
+        monitor = _load_drift_monitor(model_path)
+    except Exception as e:
+        logger.error(f"Failed to initialise drift monitor: {e}")
+    try:
+        store = _load_feature_store(model_path)
+    except Exception as e:
+        logger.error(f"Failed to map feature store: {e}")
+    return Serving(new_model, version, store, monitor)
+
+
+def _watch_for_updates():
+    global serving
+    while True:
+        time.sleep(MODEL_WATCH_INTERVAL)
+        try:
+            latest = _latest_watched_version(MODEL_WATCH_DIR)
+            if latest is None or _version_key(latest) <= _version_key(serving.version):
+                continue
+            logger.info(f"New model version detected: {latest} (serving {serving.version})")
+            new_serving = _load_serving(_find_model_path(os.path.join(MODEL_WATCH_DIR, latest)), latest)
+            # rebinding a module global is atomic; in-flight requests keep the tuple they started with
+            serving = new_serving
+            logger.info(f"Swapped in model version {latest}; memory: {get_memory_stats()}")
+        except Exception as e:
+            logger.error(f"Model hot-swap check failed: {e}")
+
+
+def _init_shadow():
+    global shadow_model, _shadow_executor
+    try:
+        shadow_model = _load_model(_find_model_path(SHADOW_MODEL_DIR))
+        _shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        logger.info(f"Shadow model loaded from {SHADOW_MODEL_DIR}; sampling {SHADOW_SAMPLE_RATE:.1%} of requests.")
+    except Exception as e:
+        logger.error(f"Failed to load shadow model, shadow scoring disabled: {e}")
+        shadow_model = None
+
+
+def _shadow_score(input_df, primary_predictions, primary_latency_ms):
+    try:
+        start = time.perf_counter()
+        shadow_predictions = np.asarray(shadow_model.predict(input_df))
+        shadow_latency_ms = (time.perf_counter() - start) * 1000
+        agreeing = int(np.sum(shadow_predictions == np.asarray(primary_predictions)))
+        with _shadow_lock:
+            _shadow_stats["requests"] += 1
+            _shadow_stats["rows"] += len(input_df)
+            _shadow_stats["agreeing_rows"] += agreeing
+            _shadow_stats["primary_latency_ms"].append(primary_latency_ms)
+            _shadow_stats["shadow_latency_ms"].append(shadow_latency_ms)
+            log_now = _shadow_stats["requests"] % SHADOW_LOG_EVERY == 0
+        if log_now:
+            logger.info(f"Shadow stats: {get_shadow_stats()}")
+    except Exception as e:
+        with _shadow_lock:
+            _shadow_stats["errors"] += 1
+        logger.error(f"Shadow scoring failed: {e}")
+    finally:
+        _shadow_slots.release()
+
+
+def _submit_shadow(input_df, primary_predictions, primary_latency_ms):
+    if shadow_model is None or random.random() >= SHADOW_SAMPLE_RATE:
+        return
+    if not _shadow_slots.acquire(blocking=False):
+        with _shadow_lock:
+            _shadow_stats["dropped"] += 1
+        return
+    _shadow_executor.submit(_shadow_score, input_df, primary_predictions, primary_latency_ms)
+
+
+def get_shadow_stats():
+    with _shadow_lock:
+        stats = {k: v for k, v in _shadow_stats.items() if not isinstance(v, deque)}
+        primary = np.array(_shadow_stats["primary_latency_ms"])
+        shadow = np.array(_shadow_stats["shadow_latency_ms"])
+    stats["agreement_rate"] = stats["agreeing_rows"] / stats["rows"] if stats["rows"] else None
+    for name, values in [("primary", primary), ("shadow", shadow)]:
+        if len(values):
+            stats[f"{name}_p50_ms"] = float(np.percentile(values, 50))
+            stats[f"{name}_p95_ms"] = float(np.percentile(values, 95))
+    return stats
+
+
+def _load_drift_monitor(model_path):
+    reference_path = DRIFT_REFERENCE_PATH or os.path.join(model_path, "drift_reference.json")
+    if not os.path.exists(reference_path):
+        logger.info("No drift reference found; drift monitoring disabled.")
+        return None
+    monitor = DriftMonitor.from_file(
+        reference_path, check_every_rows=DRIFT_CHECK_EVERY_ROWS, check_every_s=DRIFT_CHECK_EVERY_S
+    )
+    logger.info(f"Drift monitoring enabled for {len(monitor.edges)} series from {reference_path}.")
+    return monitor
+
+
+def _load_feature_store(model_path):
+    store_dir = FEATURE_STORE_DIR or os.path.join(model_path, "feature_store")
+    if not os.path.exists(os.path.join(store_dir, "meta.json")):
+        logger.info("No feature store found; ID-based scoring disabled.")
+        return None
+    store = FeatureStore(store_dir)
+    logger.info(f"Feature store mapped from {store_dir}: {len(store)} accounts.")
+    return store
+
+
+def _lookup_ids(feature_store, ids):
+    if feature_store is None:
+        raise ValueError("ID-based scoring is not enabled on this deployment.")
+    rows, found = feature_store.lookup(ids)
+    return pd.DataFrame(rows, columns=feature_store.columns, copy=False), found
+
+
+def _align_to_ids(response, ids, found):
+    """Spreads per-found-row results back over the requested IDs (None where unknown)."""
+    aligned = {}
+    for key, values in response.items():
+        it = iter(values)
+        aligned[key] = [next(it) if hit else None for hit in found]
+    aligned["missing_ids"] = [i for i, hit in zip(ids, found) if not hit]
+    return aligned
+
 
 def init():
-    global model
+    global serving
     logger.info("Starting model initialization...")
 
     try:
         base_model_dir = os.getenv("AZUREML_MODEL_DIR")
         logger.info(f"Base model directory: {base_model_dir}")
 
-        for root, dirs, files in os.walk(base_model_dir):
-            if "MLmodel" in files:
-                model_path = root
-                break
-        else:
-            raise FileNotFoundError("Could not find 'MLmodel' in any subdirectories.")
-
+        model_path = _find_model_path(base_model_dir)
         logger.info(f"Resolved model path: {model_path}")
-        model = mlflow.pyfunc.load_model(model_path)
-        logger.info("Model loaded successfully.")
+        serving = _load_serving(model_path, os.path.basename(os.path.normpath(base_model_dir or "")) or "0")
     except Exception as e:
         logger.error(f"Failed to load model: {e}")
         raise
-        
+
+    if MODEL_WATCH_DIR:
+        threading.Thread(target=_watch_for_updates, name="model-watcher", daemon=True).start()
+        logger.info(f"Watching {MODEL_WATCH_DIR} for new model versions every {MODEL_WATCH_INTERVAL:.0f}s.")
+
+    if SHADOW_MODEL_DIR and SHADOW_SAMPLE_RATE > 0:
+        _init_shadow()
+
+
+def _to_dataframe(input_data):
+    if isinstance(input_data, dict):
+        return pd.DataFrame([input_data])
+    if isinstance(input_data, list):
+        return pd.DataFrame(input_data)
+    if isinstance(input_data, pd.DataFrame):
+        return input_data
+    raise ValueError("Unsupported input format type.")
+
+
 def run(input_data):
     logger.info(f"Received input: {input_data}")
 
@@ -38,22 +337,45 @@ def run(input_data):
         if isinstance(input_data, str):
             input_data = json.loads(input_data)
 
-        if isinstance(input_data, dict):
-            input_df = pd.DataFrame([input_data])
-        elif isinstance(input_data, list):
-            input_df = pd.DataFrame(input_data)
-        elif isinstance(input_data, pd.DataFrame):
-            input_df = input_data
+        # {"data": [...] | "ids": [...], "explain": true, "top_k": 3}
+        explain_requested, top_k, ids, found = False, DEFAULT_TOP_K, None, None
+        if isinstance(input_data, dict) and ("data" in input_data or "ids" in input_data):
+            explain_requested = str(input_data.get("explain", False)).lower() == "true"
+            top_k = int(input_data.get("top_k", DEFAULT_TOP_K))
+            ids = input_data.get("ids")
+            input_data = input_data.get("data")
+
+        # one snapshot per request: model, feature store and drift reference always match
+        current = serving
+        if ids is not None:
+            input_df, found = _lookup_ids(current.feature_store, ids)
+            if not found.any():
+                return {"predictions": [None] * len(ids), "missing_ids": list(ids)}
         else:
-            raise ValueError("Unsupported input format type.")
+            input_df = _to_dataframe(input_data)
 
         logger.info(f"Converted input to DataFrame:\n{input_df}")
 
-        predictions = model.predict(input_df)
+        current_model = current.model
+        start = time.perf_counter()
+        predictions, probabilities = predict_with_probabilities(current_model, input_df)
+        latency_ms = (time.perf_counter() - start) * 1000
+        _submit_shadow(input_df, predictions, latency_ms)
+        # feature-store rows are already scaled, unlike the raw payloads the drift profile describes
+        if current.drift_monitor is not None and found is None:
+            try:
+                current.drift_monitor.update(input_df, probabilities)
+            except Exception as e:
+                logger.error(f"Drift monitor update failed: {e}")
+
         logger.info(f"Predictions: {predictions.tolist()}")
-        return {"predictions": predictions.tolist()}
+        response = {"predictions": predictions.tolist()}
+        if explain_requested:
+            response["reasons"] = explain(current_model, input_df, top_k)
+        if found is not None:
+            response = _align_to_ids(response, ids, found)
+        return response
 
     except Exception as e:
         logger.error(f"Inference error: {e}")
         return {"error": str(e)}
-
@@ -0,0 +1,24 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "serve"))
+from reason_codes import XGBoostExplainer, build_explainer, top_k_reasons
+
+xgboost = pytest.importorskip("xgboost")
+
+
+def test_xgboost_explainer_on_named_features():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(200, 3)), columns=["limit_bal", "pay_0", "age"])
+    y = (X["pay_0"] > 0).astype(int)
+    model = xgboost.XGBClassifier(n_estimators=5, max_depth=2).fit(X, y)
+
+    explainer = build_explainer(model, X.shape[1])
+    assert isinstance(explainer, XGBoostExplainer)
+    row = X[X["pay_0"] > 1].iloc[:1]
+    contributions = explainer(row.to_numpy(dtype=np.float64))
+    assert contributions.shape == (1, 3)
+    assert top_k_reasons(contributions, list(X.columns), k=1)[0][0]["feature"] == "pay_0"
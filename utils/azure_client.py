@@ -7,7 +7,12 @@ if os.getenv("GITHUB_ACTIONS") != "true":
     from dotenv import load_dotenv
     load_dotenv()
 
+_clients = {}
+
 def get_ml_client(env_name="dev"):
+    if env_name in _clients:
+        return _clients[env_name]
+
     subscription_id = os.environ.get("AZURE_SUBSCRIPTION_ID", "").strip()
     resource_group = os.environ.get("AZURE_RESOURCE_GROUP", "").strip()
     workspace_key = f"AZURE_WORKSPACE_NAME_{env_name.upper()}"
@@ -20,11 +25,12 @@ def get_ml_client(env_name="dev"):
     if not (subscription_id and resource_group and workspace_name):
         raise ValueError("One or more required Azure environment variables are missing or empty.")
 
-    return MLClient(
+    _clients[env_name] = MLClient(
         credential=DefaultAzureCredential(),
         subscription_id=subscription_id,
         resource_group_name=resource_group,
         workspace_name=workspace_name,
     )
+    return _clients[env_name]
 
 
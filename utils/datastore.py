@@ -0,0 +1,224 @@
+import os
+import json
+import mmap
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+HASH_BUFFER_SIZE = 8 * 1024 * 1024
+STREAM_CHUNK_SIZE = 4 * 1024 * 1024
+HASH_SIDECAR_SUFFIX = ".md5.json"
+UPLOAD_MANIFEST = "_upload_manifest.json"
+
+
+def _hash_file(file_path: str) -> str:
+    hasher = hashlib.md5()
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hasher.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            for offset in range(0, len(view), HASH_BUFFER_SIZE):
+                hasher.update(view[offset:offset + HASH_BUFFER_SIZE])
+            view.release()
+    return hasher.hexdigest()
+
+
+def calculate_file_hash(file_path: str, use_cache: bool = True) -> str:
+    """MD5 of a file, cached in a `<file>.md5.json` sidecar keyed by size and mtime."""
+    stat = os.stat(file_path)
+    sidecar = file_path + HASH_SIDECAR_SUFFIX
+    if use_cache and os.path.exists(sidecar):
+        try:
+            with open(sidecar) as f:
+                cached = json.load(f)
+            if cached.get("size") == stat.st_size and cached.get("mtime_ns") == stat.st_mtime_ns:
+                return cached["md5"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    file_hash = _hash_file(file_path)
+    if use_cache:
+        try:
+            with open(sidecar, "w") as f:
+                json.dump({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "md5": file_hash}, f)
+        except OSError:
+            pass
+    return file_hash
+
+
+def hashing_stream(chunks, hasher):
+    """Passes chunks through unchanged while feeding them to hasher."""
+    for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+
+
+class LocalFolderStore:
+    """Filesystem stand-in for a blob datastore; keeps an md5 sidecar per uploaded file."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def uri(self, prefix, folder=True):
+        return os.path.join(self.root, prefix)
+
+    def list_files(self, prefix):
+        """[(remote_path, size, md5)] for the file at prefix or every file below it."""
+        base = os.path.join(self.root, prefix)
+        if os.path.isfile(base):
+            paths = [base]
+        else:
+            paths = [
+                os.path.join(dirpath, f) for dirpath, _, files in os.walk(base)
+                for f in files if not f.endswith(HASH_SIDECAR_SUFFIX)
+            ]
+        # no sidecars are written: the folder may be a registered asset being read, not this store's upload area
+        return sorted(
+            (os.path.relpath(p, self.root).replace(os.sep, "/"), os.path.getsize(p),
+             calculate_file_hash(p, use_cache=False))
+            for p in paths
+        )
+
+    def open_stream(self, remote_path):
+        with open(os.path.join(self.root, remote_path), "rb") as f:
+            for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+                yield chunk
+
+    def write_stream(self, remote_path, chunks):
+        """Writes chunks to remote_path and returns the md5 of what was written."""
+        target = os.path.join(self.root, remote_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        hasher = hashlib.md5()
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            for chunk in hashing_stream(chunks, hasher):
+                f.write(chunk)
+        os.replace(tmp_path, target)
+        with open(target + HASH_SIDECAR_SUFFIX, "w") as f:
+            json.dump({"md5": hasher.hexdigest()}, f)
+        return hasher.hexdigest()
+
+    def exists(self, remote_path, md5):
+        sidecar = os.path.join(self.root, remote_path) + HASH_SIDECAR_SUFFIX
+        if not os.path.exists(sidecar):
+            return False
+        with open(sidecar) as f:
+            return json.load(f).get("md5") == md5
+
+    def upload(self, local_path, remote_path, md5):
+        target = os.path.join(self.root, remote_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(local_path, target)
+        with open(target + HASH_SIDECAR_SUFFIX, "w") as f:
+            json.dump({"md5": md5}, f)
+
+
+class BlobDatastore:
+    """Uploads straight to the workspace's default blob datastore, tagging blobs with their md5."""
+
+    def __init__(self, ml_client, max_concurrency=4, datastore_name=None):
+        from azure.identity import DefaultAzureCredential
+        from azure.storage.blob import BlobServiceClient
+
+        if datastore_name:
+            datastore = ml_client.datastores.get(datastore_name)
+        else:
+            datastore = ml_client.datastores.get_default()
+        self.datastore_name = datastore.name
+        account_url = f"https://{datastore.account_name}.blob.{datastore.endpoint}"
+        service = BlobServiceClient(account_url=account_url, credential=DefaultAzureCredential())
+        self.container = service.get_container_client(datastore.container_name)
+        self.max_concurrency = max_concurrency
+
+    def uri(self, prefix, folder=True):
+        return f"azureml://datastores/{self.datastore_name}/paths/{prefix}{'/' if folder else ''}"
+
+    def exists(self, remote_path, md5):
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            props = self.container.get_blob_client(remote_path).get_blob_properties()
+        except ResourceNotFoundError:
+            return False
+        return (props.metadata or {}).get("md5") == md5
+
+    def upload(self, local_path, remote_path, md5):
+        with open(local_path, "rb") as f:
+            self.container.upload_blob(
+                name=remote_path,
+                data=f,
+                overwrite=True,
+                metadata={"md5": md5},
+                max_concurrency=self.max_concurrency,
+            )
+
+    def list_files(self, prefix):
+        """[(remote_path, size, md5)]; md5 is None when the blob carries neither our tag nor Content-MD5."""
+        prefix = prefix.rstrip("/")
+        files = []
+        for blob in self.container.list_blobs(name_starts_with=prefix, include=["metadata"]):
+            if blob.name != prefix and not blob.name.startswith(prefix + "/"):
+                continue
+            md5 = (blob.metadata or {}).get("md5")
+            if md5 is None and blob.content_settings and blob.content_settings.content_md5:
+                md5 = bytes(blob.content_settings.content_md5).hex()
+            files.append((blob.name, blob.size, md5))
+        return sorted(files)
+
+    def open_stream(self, remote_path):
+        return self.container.download_blob(remote_path, max_concurrency=self.max_concurrency).chunks()
+
+    def write_stream(self, remote_path, chunks):
+        """Streams chunks into a blob and tags it with the md5 computed on the way through."""
+        hasher = hashlib.md5()
+        blob = self.container.get_blob_client(remote_path)
+        blob.upload_blob(hashing_stream(chunks, hasher), overwrite=True, max_concurrency=self.max_concurrency)
+        blob.set_blob_metadata({"md5": hasher.hexdigest()})
+        return hasher.hexdigest()
+
+
+def upload_folder(store, local_dir, remote_prefix, max_workers=8):
+    """Uploads every file under local_dir in parallel and resumably.
+
+    Finished files are recorded in a manifest inside local_dir, and files the
+    store already holds with the same md5 are skipped, so an interrupted run
+    picks up where it stopped.
+    """
+    manifest_path = os.path.join(local_dir, UPLOAD_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    done = manifest.setdefault(remote_prefix, {})
+    lock = threading.Lock()
+
+    files = sorted(
+        f for f in os.listdir(local_dir)
+        if os.path.isfile(os.path.join(local_dir, f))
+        and f != UPLOAD_MANIFEST and not f.endswith(HASH_SIDECAR_SUFFIX)
+    )
+
+    def upload_one(file_name):
+        local_path = os.path.join(local_dir, file_name)
+        remote_path = f"{remote_prefix}/{file_name}"
+        md5 = calculate_file_hash(local_path)
+        already_stored = store.exists(remote_path, md5)
+        if done.get(file_name) == md5 and already_stored:
+            return file_name, False
+        if not already_stored:
+            store.upload(local_path, remote_path, md5)
+        with lock:
+            done[file_name] = md5
+            with open(manifest_path, "w") as f:
+                json.dump(manifest, f, indent=2)
+        # a file the store already held is only recorded, not counted as transferred
+        return file_name, not already_stored
+
+    uploaded = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for future in as_completed([pool.submit(upload_one, f) for f in files]):
+            file_name, transferred = future.result()
+            uploaded += transferred
+            print(f"{'Uploaded' if transferred else 'Already uploaded'}: {remote_prefix}/{file_name}")
+    return store.uri(remote_prefix), uploaded, len(files)
@@ -0,0 +1,199 @@
+import os
+import re
+import json
+import time
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+ASSET_KINDS = ("components", "environments", "data", "models")
+DEFAULT_CACHE_PATH = os.path.join(".azureml", "cache", "registry_cache.json")
+DEFAULT_TTL_SECONDS = 300
+
+
+def version_key(version) -> int:
+    match = re.search(r'\d+', str(version))
+    return int(match.group()) if match else 0
+
+
+class AzureMLRegistry:
+    """Registry backend over the asset operations of a live MLClient."""
+
+    def __init__(self, ml_client):
+        self.ml_client = ml_client
+        self.workspace = ml_client.workspace_name
+
+    def list_assets(self, kind, name):
+        return list(getattr(self.ml_client, kind).list(name=name))
+
+    def get(self, kind, name, version):
+        return getattr(self.ml_client, kind).get(name=name, version=str(version))
+
+    def create_or_update(self, kind, asset):
+        return getattr(self.ml_client, kind).create_or_update(asset)
+
+
+class LocalRegistry:
+    """Filesystem stand-in for AzureMLRegistry: <root>/<kind>/<name>/<version>.json."""
+
+    def __init__(self, root, workspace="local"):
+        self.root = root
+        self.workspace = workspace
+
+    def _asset_dir(self, kind, name):
+        return os.path.join(self.root, kind, name)
+
+    def _load(self, path):
+        with open(path) as f:
+            return SimpleNamespace(**json.load(f))
+
+    def list_assets(self, kind, name):
+        asset_dir = self._asset_dir(kind, name)
+        if not os.path.isdir(asset_dir):
+            return []
+        return [self._load(os.path.join(asset_dir, f)) for f in os.listdir(asset_dir) if f.endswith(".json")]
+
+    def get(self, kind, name, version):
+        path = os.path.join(self._asset_dir(kind, name), f"{version}.json")
+        if not os.path.exists(path):
+            raise KeyError(f"{kind} '{name}' version '{version}' not found")
+        return self._load(path)
+
+    def create_or_update(self, kind, asset):
+        record = {
+            "name": asset.name,
+            "version": str(asset.version),
+            "tags": dict(getattr(asset, "tags", None) or {}),
+            "path": str(getattr(asset, "path", "") or ""),
+            "id": f"{kind}/{asset.name}/{asset.version}",
+        }
+        for field in ("type", "description", "image", "conda_file"):
+            value = getattr(asset, field, None)
+            if value is not None:
+                record[field] = value if isinstance(value, (dict, list)) else str(value)
+        os.makedirs(self._asset_dir(kind, asset.name), exist_ok=True)
+        with open(os.path.join(self._asset_dir(kind, asset.name), f"{asset.version}.json"), "w") as f:
+            json.dump(record, f, indent=2)
+        return SimpleNamespace(**record)
+
+
+class RegistryResolver:
+    """Resolves name -> latest version and content hash -> asset with a local cache.
+
+    A content hash always maps to the same asset, so hash hits are served from
+    the cache indefinitely. "Latest" goes stale as soon as anyone registers a
+    version, so it is cached for ttl_seconds and callers that act on it
+    (deploy, promote, pipeline submission) pass fresh=True.
+    """
+
+    def __init__(self, backend, ttl_seconds=DEFAULT_TTL_SECONDS, cache_path=DEFAULT_CACHE_PATH, max_workers=8):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.cache_path = cache_path
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._cache = self._read_cache()
+
+    def _read_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_cache(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._cache, f, indent=2)
+        os.replace(tmp_path, self.cache_path)
+
+    def _key(self, kind, name):
+        return f"{self.backend.workspace}|{kind}|{name}"
+
+    def _fresh(self, entry, field):
+        return entry is not None and field in entry and time.time() - entry.get("ts", 0) < self.ttl_seconds
+
+    def _refresh(self, kind, name):
+        """One listing fills both the latest version and the hash index for a name."""
+        assets = self.backend.list_assets(kind, name)
+        entry = {"ts": time.time(), "latest": None, "hashes": {}}
+        if assets:
+            entry["latest"] = str(max(assets, key=lambda a: version_key(a.version)).version)
+        for asset in assets:
+            content_hash = (getattr(asset, "tags", None) or {}).get("hash")
+            if content_hash:
+                entry["hashes"][content_hash] = str(asset.version)
+        with self._lock:
+            self._cache[self._key(kind, name)] = entry
+            self._write_cache()
+        return entry
+
+    def _cached(self, kind, name):
+        with self._lock:
+            return self._cache.get(self._key(kind, name))
+
+    def latest_version(self, kind, name, fresh=False) -> str:
+        entry = self._cached(kind, name)
+        if fresh or not self._fresh(entry, "latest"):
+            entry = self._refresh(kind, name)
+        if entry["latest"] is None:
+            raise ValueError(f"No registered versions found for {kind} '{name}'")
+        return entry["latest"]
+
+    def latest(self, kind, name, fresh=False):
+        return self.backend.get(kind, name, self.latest_version(kind, name, fresh))
+
+    def latest_many(self, requests, fresh=False):
+        """Resolves [(kind, name), ...] concurrently; returns {(kind, name): asset}."""
+        requests = list(requests)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(requests) or 1)) as pool:
+            assets = pool.map(lambda r: self.latest(*r, fresh=fresh), requests)
+            return dict(zip(requests, assets))
+
+    def find_by_hash(self, kind, name, content_hash):
+        entry = self._cached(kind, name)
+        version = (entry or {}).get("hashes", {}).get(content_hash)
+        if version is None:
+            # a miss may just mean the hash was registered after the cache was written
+            version = self._refresh(kind, name)["hashes"].get(content_hash)
+        if version is None:
+            return None
+        return self.backend.get(kind, name, version)
+
+    def record(self, kind, name, version, content_hash=None):
+        """Updates the cache after registering a new version, without another listing."""
+        with self._lock:
+            # without a listing the latest version is unknown, so a new entry only records the hash
+            entry = self._cache.setdefault(self._key(kind, name), {"ts": 0, "hashes": {}})
+            if "latest" in entry and (entry["latest"] is None
+                                      or version_key(version) >= version_key(entry["latest"])):
+                entry["latest"] = str(version)
+            if content_hash:
+                entry.setdefault("hashes", {})[content_hash] = str(version)
+            self._write_cache()
+
+
+_resolvers = {}
+
+
+def get_resolver(env_name="dev"):
+    """One resolver (and one MLClient) per workspace for the lifetime of the process.
+
+    AZUREML_LOCAL_REGISTRY points the resolver at a LocalRegistry directory instead
+    of a workspace; AZUREML_RESOLVER_TTL overrides the cache TTL (0 disables caching).
+    """
+    if env_name not in _resolvers:
+        ttl = float(os.environ.get("AZUREML_RESOLVER_TTL", DEFAULT_TTL_SECONDS))
+        local_root = os.environ.get("AZUREML_LOCAL_REGISTRY")
+        if local_root:
+            backend = LocalRegistry(os.path.join(local_root, env_name), workspace=f"local-{env_name}")
+        else:
+            from utils.azure_client import get_ml_client
+            backend = AzureMLRegistry(get_ml_client(env_name))
+        _resolvers[env_name] = RegistryResolver(backend, ttl_seconds=ttl)
+    return _resolvers[env_name]